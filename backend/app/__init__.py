@@ -5,7 +5,8 @@ from app.config.config import Config
 from app.routes import register_routes
 from app.auth.firebase import init_firebase
 from flask_cors import CORS
-from app.cron import start_cron
+from app.cron import start_cron, start_outbox_workers
+from app.db.connection import init_db
 
 def create_app():
     app = Flask(__name__)
@@ -16,7 +17,9 @@ def create_app():
 
     # 🔧 Enregistrement des routes et services
     register_routes(app)
+    init_db(app)
     init_firebase()
     start_cron()
+    start_outbox_workers()
 
     return app
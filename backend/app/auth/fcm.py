@@ -1,25 +1,114 @@
 import json
+import threading
 import traceback
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from google.auth.transport.requests import Request
+from requests.adapters import HTTPAdapter
 from google.oauth2 import service_account
 from urllib.parse import urljoin
 from app.config import Config
+from app.db.connection import get_pool
 from app.utils.logger import log_backend
 
 firebase_credentials = Config.FIREBASE_CREDENTIALS
 frontend_url = Config.FRONTEND_URL
 
 SCOPES = ["https://www.googleapis.com/auth/firebase.messaging"]
+# en dessous de cette marge avant expiration, le token est renouvelé en arrière-plan
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# en dessous de celle-ci, on attend le renouvellement avant d'envoyer
+TOKEN_MIN_VALIDITY = timedelta(seconds=30)
+
+
+def _create_session():
+    # connexions keep-alive réutilisées, une par thread d'envoi au maximum
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.FCM_MAX_WORKERS)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _create_session()
+_executor = ThreadPoolExecutor(max_workers=Config.FCM_MAX_WORKERS, thread_name_prefix="fcm")
+
+
+class FcmCredentials:
+    """
+    Credentials du compte de service Firebase, parsées une seule fois.
+    Le token OAuth est réutilisé jusqu'à peu avant son expiration (thread-safe).
+    """
+
+    def __init__(self, raw_credentials):
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.credentials = None
+        if not raw_credentials:
+            log_backend.warning("FIREBASE_CREDENTIALS absent : notifications push désactivées", {"origin": "FCM", "code": "FCM_CREDENTIALS_MISSING"})
+            return
+        try:
+            service_account_info = json.loads(raw_credentials or "{}")
+            self.credentials = service_account.Credentials.from_service_account_info(
+                service_account_info, scopes=SCOPES
+            )
+        except Exception as e:
+            log_backend.error(
+                f"Erreur lecture des credentials FCM : {e}",
+                {"origin": "FCM", "code": "FCM_CREDENTIALS_ERROR", "error": traceback.format_exc()}
+            )
+
+    def _remaining(self):
+        # `expiry` est un datetime UTC naïf côté google-auth
+        expiry = self.credentials.expiry
+        if not self.credentials.token or expiry is None:
+            return timedelta(0)
+        return expiry - datetime.utcnow()
+
+    def _refresh(self):
+        self.credentials.refresh(Request())
+        log_backend.debug(
+            "Token FCM renouvelé",
+            {"origin": "FCM", "code": "FCM_ACCESS_TOKEN_REFRESHED", "expiry": str(self.credentials.expiry)}
+        )
+
+    def _refresh_in_background(self):
+        try:
+            with self._lock:
+                if self._remaining() > TOKEN_REFRESH_MARGIN:
+                    return
+                self._refresh()
+        except Exception as e:
+            log_backend.warning(
+                f"Renouvellement FCM en arrière-plan échoué : {e}",
+                {"origin": "FCM", "code": "FCM_ACCESS_TOKEN_ERROR", "error": str(e)}
+            )
+        finally:
+            self._refreshing = False
+
+    def get_token(self):
+        if self.credentials is None:
+            return None, None
+
+        remaining = self._remaining()
+        if remaining <= TOKEN_MIN_VALIDITY:
+            with self._lock:
+                # un autre thread a pu renouveler pendant l'attente du verrou
+                if self._remaining() <= TOKEN_MIN_VALIDITY:
+                    self._refresh()
+        elif remaining <= TOKEN_REFRESH_MARGIN and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+        return self.credentials.token, self.credentials.project_id
+
+
+_fcm_credentials = FcmCredentials(firebase_credentials)
+
 
 def get_fcm_access_token():
     try:
-        service_account_info = json.loads(firebase_credentials or "{}")
-        credentials_obj = service_account.Credentials.from_service_account_info(
-            service_account_info, scopes=SCOPES
-        )
-        credentials_obj.refresh(Request())
-        return credentials_obj.token, credentials_obj.project_id
+        return _fcm_credentials.get_token()
     except Exception as e:
         log_backend.error(
             f"Erreur get_fcm_access_token : {e}", 
@@ -31,63 +120,137 @@ def get_fcm_access_token():
         )
         return None, None
 
-def send_fcm_notification(tokens, title, body, json_body):
-    access_token, project_id = get_fcm_access_token()
-    url = f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json; UTF-8",
-    }
-
-    errors = []
-    for token in tokens:
-        payload = {
-            "message": {
-                "token": token,
-                "notification": {
-                    "title": title,
-                    "body": body,
-                    "image": urljoin(frontend_url or "", "/icons/icon-192.png")
-                },
-                "webpush": {
-                    "fcm_options": {
-                        "link": json_body.get("link") if json_body.get("link") else urljoin(frontend_url or "", "/notifications")
-                    }
+def _build_message(token, title, body, json_body):
+    return {
+        "message": {
+            "token": token,
+            "notification": {
+                "title": title,
+                "body": body,
+                "image": urljoin(frontend_url or "", "/icons/icon-192.png")
+            },
+            "webpush": {
+                "fcm_options": {
+                    "link": json_body.get("link") if json_body.get("link") else urljoin(frontend_url or "", "/notifications")
                 }
             }
         }
+    }
 
-        response = requests.post(url, headers=headers, json=payload)
-        log_backend.info(
-            f"send_fcm_notification : {response.status_code}", 
+
+def _is_unregistered(data):
+    """Vrai si FCM indique que le token n'existe plus (app désinstallée, token expiré...)."""
+    if not isinstance(data, dict):
+        return False
+    for detail in (data.get("error") or {}).get("details") or []:
+        if detail.get("errorCode") == "UNREGISTERED":
+            return True
+    return False
+
+
+def _send_one(url, headers, token, title, body, json_body):
+    """Envoie à un appareil. Retourne None si OK, sinon le détail de l'erreur."""
+    try:
+        response = _session.post(
+            url,
+            headers=headers,
+            json=_build_message(token, title, body, json_body),
+            timeout=(Config.FCM_CONNECT_TIMEOUT, Config.FCM_READ_TIMEOUT)
+        )
+    except requests.RequestException as e:
+        log_backend.error(
+            f"Erreur send_fcm_notification : {e}",
+            {"origin": "FCM", "code": "FCM_REQUEST_ERROR", "token": token, "error": str(e)}
+        )
+        return {"token": token, "status_code": None, "response": str(e)}
+
+    log_backend.info(
+        f"send_fcm_notification : {response.status_code}", 
+        {
+            "origin": "FCM", 
+            "code": "FCM_SEND_NOTIFICATION", 
+            "status_code": response.status_code,
+            "token": token,
+            "title": title,
+            "body": body
+        }
+    )
+    try:
+        data = response.json()
+    except Exception as e:
+        log_backend.error(
+            f"Erreur send_fcm_notification : {e}", 
             {
                 "origin": "FCM", 
-                "code": "FCM_SEND_NOTIFICATION", 
-                "status_code": response.status_code,
-                "token": token,
-                "title": title,
-                "body": body
+                "code": "FCM_ERROR", 
+                "error": traceback.format_exc()
             }
         )
-        try:
-            data = response.json()
-        except Exception as e:
-            log_backend.error(
-                f"Erreur send_fcm_notification : {e}", 
-                {
-                    "origin": "FCM", 
-                    "code": "FCM_ERROR", 
-                    "error": traceback.format_exc()
-                }
-            )
-            data = response.text
+        data = response.text
+
+    if response.status_code == 200:
+        return None
+    return {
+        "token": token,
+        "status_code": response.status_code,
+        "response": data,
+        "unregistered": _is_unregistered(data)
+    }
+
+
+def prune_fcm_tokens(tokens):
+    """
+    Supprime de `fcm_tokens` les tokens que FCM ne reconnaît plus.
+    Connexion du pool et commit immédiat, hors transaction de la requête : la suppression
+    est conservée même si la route répond en erreur (autres tokens en échec).
+    """
+    if not tokens:
+        return
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM fcm_tokens WHERE token = ANY(%s)", (list(tokens),))
+                conn.commit()
+        log_backend.info(
+            f"{len(tokens)} token(s) FCM obsolète(s) supprimé(s)",
+            {"origin": "FCM", "code": "FCM_TOKENS_PRUNED", "count": len(tokens)}
+        )
+    except Exception as e:
+        log_backend.error(
+            f"Erreur suppression tokens FCM : {e}",
+            {"origin": "FCM", "code": "FCM_PRUNE_ERROR", "error": str(e)}
+        )
+
+
+def send_fcm_notification(tokens, title, body, json_body):
+    """
+    Envoie la notification à tous les appareils en parallèle (session HTTP partagée).
+    Retourne la liste des erreurs, vide si tout est passé.
+    """
+    tokens = list(dict.fromkeys(tokens))
+    if not tokens:
+        return []
+
+    access_token, project_id = get_fcm_access_token()
+    if not access_token:
+        return [{"token": token, "status_code": None, "response": "token FCM indisponible"} for token in tokens]
+
+    url = f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json; UTF-8",
+    }
 
-        if response.status_code != 200:
-            errors.append({
-                "token": token,
-                "status_code": response.status_code,
-                "response": data
-            })
+    if len(tokens) == 1:
+        results = [_send_one(url, headers, tokens[0], title, body, json_body)]
+    else:
+        results = list(_executor.map(
+            lambda token: _send_one(url, headers, token, title, body, json_body),
+            tokens
+        ))
 
+    errors = [result for result in results if result is not None]
+    prune_fcm_tokens([error["token"] for error in errors if error.get("unregistered")])
     return errors
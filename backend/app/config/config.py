@@ -19,8 +19,19 @@ class Config:
     SUPABASE_PROJECT_URL = os.getenv("SUPABASE_PROJECT_URL")
     SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
     SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+
+    # Pool de connexions PostgreSQL (par process)
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_MAX_LIFETIME = int(os.getenv("DB_POOL_MAX_LIFETIME", 1800))  # secondes
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # attente max d'une connexion libre
+    DB_POOL_HEALTH_CHECK_IDLE = int(os.getenv("DB_POOL_HEALTH_CHECK_IDLE", 30))  # ping si inactive depuis
+
     # Firebase
     FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS")
+    FCM_MAX_WORKERS = int(os.getenv("FCM_MAX_WORKERS", 8))  # envois simultanés vers FCM
+    FCM_CONNECT_TIMEOUT = float(os.getenv("FCM_CONNECT_TIMEOUT", 3))
+    FCM_READ_TIMEOUT = float(os.getenv("FCM_READ_TIMEOUT", 10))
 
     # Cloudinary
     CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
@@ -31,6 +42,48 @@ class Config:
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     SYSTEM_UID = os.getenv("SYSTEM_UID")
 
+    # Cache : "memory" (par process) ou "redis" (partagé entre workers)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+    SCHEDULE_CACHE_TTL = int(os.getenv("SCHEDULE_CACHE_TTL", 3600))
+    SCHEDULE_CACHE_MAX_ENTRIES = int(os.getenv("SCHEDULE_CACHE_MAX_ENTRIES", 2048))
+
+    # Cache des JWT vérifiés (par process) : jusqu'à `exp`, plafonné à JWT_CACHE_MAX_TTL
+    JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", 10000))
+    JWT_CACHE_MAX_TTL = int(os.getenv("JWT_CACHE_MAX_TTL", 3600))
+    JWT_NEGATIVE_CACHE_TTL = int(os.getenv("JWT_NEGATIVE_CACHE_TTL", 30))
+
+    # Cache des droits d'accès aux calendriers (propriétaire / partage)
+    AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 30))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+    # Cache de résolution des tokens de partage publics. Avec CACHE_BACKEND=memory, une révocation
+    # n'est oubliée que par le worker qui l'a traitée : les routes des liens de partage (planning, médicaments)
+    # revérifient le token en base, les autres vérifications peuvent rester en retard jusqu'au TTL.
+    TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 60))
+    TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))
+
+    # Plannings pré-générés des calendriers partagés par token : semaine courante + N suivantes
+    SCHEDULE_SNAPSHOT_WEEKS = int(os.getenv("SCHEDULE_SNAPSHOT_WEEKS", 4))
+    SCHEDULE_SNAPSHOT_WORKERS = int(os.getenv("SCHEDULE_SNAPSHOT_WORKERS", 2))
+    # Durée (secondes) pendant laquelle navigateurs et proxys peuvent resservir un planning public
+    TOKEN_SCHEDULE_MAX_AGE = int(os.getenv("TOKEN_SCHEDULE_MAX_AGE", 60))
+
+    # Cron : intervalle (secondes) entre deux tentatives de prise du verrou leader
+    CRON_LEADER_CHECK_INTERVAL = int(os.getenv("CRON_LEADER_CHECK_INTERVAL", 30))
+
+    # Outbox des notifications : workers d'envoi en arrière-plan (0 = désactivé dans ce process)
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 2))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))  # secondes
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 300))  # ligne reprise si le worker meurt
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+    OUTBOX_BACKOFF_BASE = int(os.getenv("OUTBOX_BACKOFF_BASE", 30))  # secondes, doublé à chaque échec
+    OUTBOX_BACKOFF_MAX = int(os.getenv("OUTBOX_BACKOFF_MAX", 3600))
+
+    # Stock faible : nouvelle alerte pour une boîte toujours sous le seuil après ce délai (0 = jamais)
+    LOW_STOCK_REALERT_DAYS = int(os.getenv("LOW_STOCK_REALERT_DAYS", 30))
+
     # Frontend URL
     FRONTEND_URL = os.getenv("FRONTEND_URL")
 
@@ -39,8 +92,14 @@ class Config:
     SMTP_PORT = os.getenv("SMTP_PORT")
     NOTIFICATION_EMAIL_ADDRESS = os.getenv("NOTIFICATION_EMAIL_ADDRESS")
     NOTIFICATION_EMAIL_PASSWORD = os.getenv("NOTIFICATION_EMAIL_PASSWORD")
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))  # sessions SMTP ouvertes en même temps
+    SMTP_NOOP_AFTER = int(os.getenv("SMTP_NOOP_AFTER", 30))  # NOOP avant réutilisation si inactive depuis
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 15))
 
     # SMS
     TWILIO_API_KEY_SID = os.getenv("TWILIO_API_KEY_SID")
     TWILIO_API_KEY_SECRET = os.getenv("TWILIO_API_KEY_SECRET")
-    TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
\ No newline at end of file
+    TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
+    TWILIO_TIMEOUT = float(os.getenv("TWILIO_TIMEOUT", 10))
+    SMS_MAX_WORKERS = int(os.getenv("SMS_MAX_WORKERS", 4))  # envois simultanés vers Twilio
+    SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", 10))  # débit max accepté par le messaging service
\ No newline at end of file
@@ -1 +1,2 @@
 from .scheduler import *
+from .notification_worker import *
\ No newline at end of file
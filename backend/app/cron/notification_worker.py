@@ -0,0 +1,87 @@
+import time
+from threading import Thread
+from app.config import Config
+from app.db.connection import get_connection
+from app.services.notifications import deliver_notification, send_email_notifications, send_sms_notifications
+from app.services.user import fetch_users
+from app.services.outbox import claim_outbox, mark_outbox_sent, mark_outbox_failed, wait_for_outbox
+from app.utils.logger import log_backend
+
+
+def process_outbox_batch():
+    """Réserve un lot de notifications, les envoie, puis enregistre le résultat. Retourne la taille du lot."""
+    # transaction courte : les lignes sont marquées `processing` puis libérées tout de suite
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            rows = claim_outbox(cursor, Config.OUTBOX_BATCH_SIZE)
+
+    # destinataires chargés en une requête pour tout le lot
+    users = fetch_users(row["user_id"] for row in rows if row["channel"] != "push")
+    results = {}
+
+    # les emails partent sur une même session SMTP, les SMS ensemble (concurrence et débit bornés),
+    # les push un par un
+    for channel, send_batch in (("email", send_email_notifications), ("sms", send_sms_notifications)):
+        channel_rows = [row for row in rows if row["channel"] == channel]
+        if not channel_rows:
+            continue
+        try:
+            channel_results = send_batch([
+                (row["user_id"], row.get("payload") or {}, row["type"], users.get(str(row["user_id"]), {}))
+                for row in channel_rows
+            ])
+        except Exception as e:
+            channel_results = [{"success": False, "error": str(e)} for _ in channel_rows]
+        for row, result in zip(channel_rows, channel_results):
+            results[row["id"]] = result
+
+    for row in rows:
+        if row["id"] in results:
+            continue
+        # l'envoi (FCM, SMTP) se fait hors transaction
+        try:
+            results[row["id"]] = deliver_notification(
+                row["user_id"], row["channel"], row["type"], row.get("payload") or {},
+                users.get(str(row["user_id"]), {})
+            )
+        except Exception as e:
+            results[row["id"]] = {"success": False, "error": str(e)}
+
+    for row in rows:
+        result = results[row["id"]]
+        error = None if result.get("success") else result.get("error") or "échec de l'envoi"
+
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                if error is None:
+                    mark_outbox_sent(cursor, row["id"])
+                else:
+                    mark_outbox_failed(cursor, row["id"], row["attempts"], error)
+
+        if error is not None:
+            log_backend.warning(
+                f"Envoi {row['channel']} échoué (tentative {row['attempts']}) : {error}",
+                {"origin": "OUTBOX", "code": "OUTBOX_DELIVERY_FAILED", "outbox_id": row["id"], "uid": row["user_id"]}
+            )
+
+    return len(rows)
+
+
+def run_outbox_worker():
+    while True:
+        try:
+            # on enchaîne les lots tant qu'il y a du travail
+            if process_outbox_batch() >= Config.OUTBOX_BATCH_SIZE:
+                continue
+        except Exception as e:
+            log_backend.error(f"Erreur worker outbox : {e}", {"origin": "OUTBOX", "code": "OUTBOX_WORKER_ERROR", "error": str(e)})
+            time.sleep(Config.OUTBOX_POLL_INTERVAL)
+        wait_for_outbox(Config.OUTBOX_POLL_INTERVAL)
+
+
+def start_outbox_workers():
+    for i in range(Config.OUTBOX_WORKERS):
+        t = Thread(target=run_outbox_worker, name=f"outbox-{i}")
+        t.daemon = True
+        t.start()
+    log_backend.info(f"📬 [OUTBOX] {Config.OUTBOX_WORKERS} worker(s) de notifications démarré(s)", {"origin": "OUTBOX", "code": "OUTBOX_STARTED"})
@@ -2,20 +2,118 @@ import schedule
 import time
 from threading import Thread
 from app.cron.tasks.stock import decrease_stock
+from app.config import Config
+from app.db.connection import connect
 from app.utils.logger import log_backend
 
-def run_scheduler():
+# Clé du verrou consultatif PostgreSQL partagée par tous les process ("medi")
+CRON_LOCK_KEY = 0x6D656469
+
+
+def register_jobs(scheduler):
     # toute les semaines le lundi a 00:00
-    schedule.every().monday.at("00:00").do(decrease_stock)
+    scheduler.every().monday.at("00:00").do(decrease_stock)
     # toute les jours a 00:00
-    #schedule.every(1).day.at("00:00").do(decrease_stock)
+    #scheduler.every(1).day.at("00:00").do(decrease_stock)
     # toute les 10 secondes
-    #schedule.every(10).seconds.do(decrease_stock)
+    #scheduler.every(10).seconds.do(decrease_stock)
+
+
+class CronLeader:
+    """
+    Élection d'un seul process leader pour le cron via `pg_try_advisory_lock`.
+
+    Le verrou est tenu par une connexion dédiée (hors pool) : il disparaît tout seul
+    si le process meurt ou si la connexion est coupée, et un autre process le reprend.
+    """
+
+    def __init__(self, key=CRON_LOCK_KEY):
+        self.key = key
+        self.conn = None
+
+    @property
+    def is_leader(self):
+        return self.conn is not None
+
+    def try_acquire(self):
+        if self.conn is not None:
+            return True
+
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (self.key,))
+                locked = cursor.fetchone().get("locked")
+        except Exception as e:
+            log_backend.warning(f"Impossible de tenter le verrou du cron : {e}", {"origin": "CRON", "code": "CRON_LEADER_ERROR", "error": str(e)})
+            locked = False
+
+        if locked:
+            self.conn = conn
+            return True
+
+        if conn is not None:
+            conn.close()
+        return False
+
+    def is_alive(self):
+        """Vérifie que la connexion qui tient le verrou est toujours ouverte."""
+        if self.conn is None:
+            return False
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (self.key,))
+        except Exception:
+            pass
+        finally:
+            conn.close()
+
+
+def run_scheduler():
+    leader = CronLeader()
+    scheduler = None
+    last_check = None
 
     log_backend.info("⏳ [CRON] Test : cron toutes les jours initialisé")
 
     while True:
-        schedule.run_pending()
+        now = time.monotonic()
+        if last_check is None or now - last_check >= Config.CRON_LEADER_CHECK_INTERVAL:
+            last_check = now
+            if scheduler is None:
+                if leader.try_acquire():
+                    # nouveau scheduler : les prochaines exécutions partent de maintenant,
+                    # on ne rejoue pas ce que l'ancien leader a déjà lancé
+                    scheduler = schedule.Scheduler()
+                    register_jobs(scheduler)
+                    log_backend.info("👑 [CRON] Ce process est leader du cron", {"origin": "CRON", "code": "CRON_LEADER_ACQUIRED"})
+            elif not leader.is_alive():
+                scheduler = None
+                log_backend.warning("[CRON] Verrou du cron perdu, passage en attente", {"origin": "CRON", "code": "CRON_LEADER_LOST"})
+
+        if scheduler is not None:
+            idle = scheduler.idle_seconds
+            # juste avant de lancer une tâche, on revérifie qu'on tient toujours le verrou
+            if idle is not None and idle <= 0 and not leader.is_alive():
+                scheduler = None
+                log_backend.warning("[CRON] Verrou du cron perdu, passage en attente", {"origin": "CRON", "code": "CRON_LEADER_LOST"})
+            else:
+                scheduler.run_pending()
+
         time.sleep(1)
 
 
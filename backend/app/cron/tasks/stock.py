@@ -1,58 +1,58 @@
 # app/cron/tasks/stock.py
 from app.db.connection import get_connection
-from app.services.notifications import notify_and_record
+from app.services.notifications import notify_low_stock
 from app.utils.logger import log_backend
 from app.config import Config
-from urllib.parse import urljoin
-from app.services.process_box_decrement import process_box_decrement
+from app.services.process_box_decrement import process_boxes_decrement
 from datetime import datetime, timezone
 
-# Vérifie les stocks faibles et envoie des notifications
+RESET_LOW_STOCK_ALERTS_SQL = """
+    UPDATE medicine_boxes
+    SET low_stock_alerted_at = NULL, low_stock_alerted_qty = NULL
+    WHERE low_stock_alerted_at IS NOT NULL
+        AND (stock_alert_threshold <= 0 OR stock_quantity > stock_alert_threshold)
+"""
+
+CLAIM_LOW_STOCK_ALERTS_SQL = """
+    UPDATE medicine_boxes m
+    SET low_stock_alerted_at = NOW(), low_stock_alerted_qty = m.stock_quantity
+    FROM calendars c
+    LEFT JOIN users u ON u.id = c.owner_uid
+    WHERE c.id = m.calendar_id
+        AND m.stock_alert_threshold > 0
+        AND m.stock_quantity <= m.stock_alert_threshold
+        AND (
+            m.low_stock_alerted_at IS NULL
+            -- le stock ne baisse que par consommation : plus haut qu'à l'alerte = réapprovisionné
+            OR m.stock_quantity > m.low_stock_alerted_qty
+            OR (%(realert_days)s > 0 AND m.low_stock_alerted_at <= NOW() - make_interval(days => %(realert_days)s))
+        )
+    RETURNING m.id, m.name, m.stock_quantity, m.stock_alert_threshold, m.calendar_id,
+              c.name AS calendar_name, c.owner_uid, to_jsonb(u) AS owner
+"""
+
+# Vérifie les stocks faibles et envoie des notifications (un récapitulatif par propriétaire)
 def check_low_stock_and_notify():
     log_backend.info("🔍 Vérification des stocks faibles", {"origin": "CRON", "code": "STOCK_CHECK_INIT"})
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT m.id, m.name, m.stock_quantity, m.stock_alert_threshold, c.owner_uid, m.calendar_id
-            FROM medicine_boxes m
-            JOIN calendars c ON m.calendar_id = c.id
-            WHERE m.stock_quantity <= m.stock_alert_threshold AND m.stock_alert_threshold > 0
-        """)
-
-        results = cursor.fetchall()
-
-        for result in results:
-            id_box = result.get("id")
-            calendar_id = result.get("calendar_id")
-            qty = result.get("stock_quantity")
-            threshold = result.get("stock_alert_threshold")
-            owner_uid = result.get("owner_uid")
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # boîtes revenues au-dessus du seuil : l'alerte pourra repartir au prochain passage
+                cursor.execute(RESET_LOW_STOCK_ALERTS_SQL)
+                reset_count = cursor.rowcount
 
-            # TODO: ajouter le lien pour ouvrir la boîte de médicament dans l'application
-            link = urljoin(Config.FRONTEND_URL or "", f"/medication/{id_box}")
+                # boîtes à alerter (passage sous le seuil ou délai de relance écoulé), marquées dans la même requête
+                cursor.execute(CLAIM_LOW_STOCK_ALERTS_SQL, {"realert_days": Config.LOW_STOCK_REALERT_DAYS})
+                boxes = cursor.fetchall()
 
-            if qty <= threshold:
-                try:
-                    notify_and_record(
-                        uid=owner_uid,
-                        json_body={
-                            "link": link,
-                            "medication_id": id_box,
-                            "medication_qty": qty,
-                            "calendar_id": calendar_id,
-                            "sender_uid": Config.SYSTEM_UID
-                        },
-                        notif_type="low_stock",
-                    )
-                    log_backend.info(f"✅ Notification de stock faible envoyée à {owner_uid} pour le médicament {id_box}", {"origin": "CRON", "code": "STOCK_CHECK_SUCCESS"})
-                except Exception as e:
-                    log_backend.error(f"Erreur lors de l'envoi de la notification de stock faible à {owner_uid}: {e}", {"origin": "CRON", "code": "STOCK_CHECK_ERROR", "error": str(e)})
+                sent = notify_low_stock(cursor, boxes)
+            conn.commit()
 
-        conn.close()
-        log_backend.info("✅ Fin de la vérification des stocks", {"origin": "CRON", "code": "STOCK_CHECK_SUCCESS"})
+        log_backend.info(
+            f"✅ Fin de la vérification des stocks : {len(boxes)} boîtes, {sent} envois",
+            {"origin": "CRON", "code": "STOCK_CHECK_SUCCESS", "boxes_count": len(boxes), "deliveries": sent, "reset_count": reset_count}
+        )
 
     except Exception as e:
         log_backend.error(f"Erreur lors de la vérification des stocks: {e}", {"origin": "CRON", "code": "STOCK_CHECK_ERROR", "error": str(e)})
@@ -60,35 +60,18 @@ def check_low_stock_and_notify():
 # diminuer le stock de tous les médicaments
 def decrease_stock():
     try:
+        current_date = datetime.now(timezone.utc).date()
+
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                # recup les calendar avec stock_decrement_mode = auto
-                cursor.execute("""
-                    SELECT * FROM calendars
-                    WHERE stock_decrement_mode = 'auto'
-                """)
-                calendars = cursor.fetchall()
-
-                for calendar in calendars:
-                    calendar_id = calendar.get("id")
-                    cursor.execute("""
-                        SELECT * FROM medicine_boxes
-                        WHERE calendar_id = %s and stock_quantity > 0
-                    """, (calendar_id,))
-                    results = cursor.fetchall()
-
-                    current_date = datetime.now(timezone.utc).date()
+                # une seule requête pour toutes les boîtes des calendriers en mode auto
+                updated_boxes = process_boxes_decrement(cursor, current_date)
+            conn.commit()
 
-                    for result in results:
-                        id_box = result.get("id")
-                        qty = result.get("stock_quantity")
-                        process_box_decrement(cursor, id_box, qty, current_date)
+        log_backend.info(f"📉 Stock diminué pour {len(updated_boxes)} boîtes", {"origin": "CRON", "code": "STOCK_DECREASE_APPLIED", "boxes_count": len(updated_boxes)})
 
-            conn.commit()
-            
         check_low_stock_and_notify()
         log_backend.info("✅ Fin de la diminution des stocks", {"origin": "CRON", "code": "STOCK_DECREASE_SUCCESS"})
 
     except Exception as e:
         log_backend.error(f"Erreur lors de la diminution des stocks: {e}", {"origin": "CRON", "code": "STOCK_DECREASE_ERROR", "error": str(e)})
-
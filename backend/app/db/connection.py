@@ -2,12 +2,23 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
+import threading
+from flask import g, has_request_context
+from app.config.config import Config
+from app.db.pool import ConnectionPool
+from app.utils.logger import log_backend as logger
+from app.utils.response import error_response
 
 # 🔒 Optionnel : charge les variables depuis .env
 from dotenv import load_dotenv
 load_dotenv()
 
-def get_connection():
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect():
+    """Ouvre une nouvelle connexion PostgreSQL (hors pool)."""
     return psycopg2.connect(
         host=os.getenv("PG_HOST"),
         dbname=os.getenv("PG_DATABASE"),
@@ -17,3 +28,310 @@ def get_connection():
         sslmode="require",
         cursor_factory=RealDictCursor
     )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect,
+                    min_size=Config.DB_POOL_MIN_SIZE,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    health_check_idle=Config.DB_POOL_HEALTH_CHECK_IDLE,
+                )
+    return _pool
+
+
+class UnitOfWork:
+    """
+    Connexion + transaction uniques pour toute une requête Flask (stockée dans `flask.g`).
+
+    Tous les `get_connection()` appelés pendant la requête partagent la même connexion ;
+    le commit n'a lieu qu'une fois, en fin de requête, si aucune erreur n'a été vue.
+    """
+
+    def __init__(self):
+        self.conn = get_pool().connection()
+        self.failed = False
+        self.done = False
+        self._on_commit = []
+        self._savepoint_seq = 0
+        self.wrote = False  # au moins une écriture dans la transaction
+
+    def fail(self):
+        if not self.failed:
+            self.failed = True
+            try:
+                # libère la transaction en erreur pour que la suite de la requête puisse lire
+                self.conn.rollback()
+            except Exception:
+                pass
+
+    def savepoint(self):
+        """Ouvre un SAVEPOINT et retourne son nom (None si la requête est déjà en échec)."""
+        if self.failed:
+            return None
+        self._savepoint_seq += 1
+        name = f"uow_{self._savepoint_seq}"
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"SAVEPOINT {name}")
+        except Exception:
+            self.fail()
+            return None
+        return name
+
+    def release(self, name):
+        if name is None or self.failed:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"RELEASE SAVEPOINT {name}")
+        except Exception:
+            self.fail()
+
+    def abort_block(self, savepoint, callbacks_mark):
+        """
+        Annule un bloc `with get_connection()` en erreur : retour à son SAVEPOINT s'il a écrit.
+        Un bloc sans écriture n'a rien à annuler, sauf si la transaction est restée en erreur :
+        elle est alors réinitialisée (ou toute la requête échoue si des écritures précédentes sont en jeu).
+        """
+        if self.failed:
+            return
+        try:
+            if savepoint is not None:
+                with self.conn.cursor() as cursor:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+            elif self.conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                if self.wrote:
+                    self.fail()
+                    return
+                self.conn.rollback()
+        except Exception:
+            self.fail()
+            return
+        # les callbacks enregistrés par le bloc annulé ne doivent pas s'exécuter
+        del self._on_commit[callbacks_mark:]
+
+    def on_commit(self, callback):
+        """Enregistre une fonction à exécuter une fois la transaction validée."""
+        self._on_commit.append(callback)
+
+    def commit(self):
+        self.conn.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("erreur dans un callback post-commit", {
+                    "origin": "DB_UNIT_OF_WORK",
+                    "error": str(e)
+                })
+
+    def rollback(self):
+        self._on_commit = []
+        self.conn.rollback()
+
+    def close(self):
+        if self.done:
+            return
+        self.done = True
+        self.conn.close()
+
+
+# premiers mots-clés des requêtes qui n'écrivent rien (un WITH peut contenir un UPDATE : traité comme écriture)
+READ_ONLY_STATEMENTS = ("SELECT", "SHOW")
+
+
+def _is_write(query):
+    if isinstance(query, bytes):
+        query = query.decode(errors="ignore")
+    lines = [line for line in str(query).strip().splitlines() if not line.strip().startswith("--")]
+    keyword = " ".join(lines).lstrip("( ").split(maxsplit=1)
+    return not keyword or keyword[0].upper() not in READ_ONLY_STATEMENTS
+
+
+class RequestCursor:
+    """Curseur de la connexion de la requête : ouvre le SAVEPOINT du bloc juste avant sa première écriture."""
+
+    def __init__(self, connection, cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def execute(self, query, params=None):
+        if _is_write(query):
+            self._connection.before_write()
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, params_seq):
+        if _is_write(query):
+            self._connection.before_write()
+        return self._cursor.executemany(query, params_seq)
+
+
+class RequestConnection:
+    """
+    Vue sur la connexion de la requête renvoyée par `get_connection()`.
+
+    `with` et `commit()` ne valident rien (c'est la fin de requête qui commit).
+    Un bloc `with` qui écrit tourne dans un SAVEPOINT, ouvert à sa première écriture : une exception
+    n'annule que ce bloc, même si l'appelant l'ignore ensuite. Les blocs en lecture seule ne coûtent
+    aucun aller-retour supplémentaire.
+    """
+
+    def __init__(self, unit_of_work):
+        self._uow = unit_of_work
+        self._blocks = []  # [{"savepoint": nom ou None, "mark": nb de callbacks post-commit à l'entrée}]
+
+    def __getattr__(self, name):
+        return getattr(self._uow.conn, name)
+
+    def __enter__(self):
+        self._blocks.append({"savepoint": None, "mark": len(self._uow._on_commit)})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        block = self._blocks.pop() if self._blocks else None
+        if block is None:
+            if exc_type is not None:
+                self._uow.fail()
+        elif exc_type is not None:
+            self._uow.abort_block(block["savepoint"], block["mark"])
+        else:
+            self._uow.release(block["savepoint"])
+        return False
+
+    def cursor(self, *args, **kwargs):
+        return RequestCursor(self, self._uow.conn.cursor(*args, **kwargs))
+
+    def before_write(self):
+        self._uow.wrote = True
+        if self._blocks and self._blocks[-1]["savepoint"] is None:
+            self._blocks[-1]["savepoint"] = self._uow.savepoint()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        if not self._blocks:
+            self._uow.fail()
+            return
+        # annule le bloc courant ; la prochaine écriture rouvrira un point de sauvegarde
+        block = self._blocks[-1]
+        self._uow.abort_block(block["savepoint"], block["mark"])
+        block["savepoint"] = None
+        block["mark"] = len(self._uow._on_commit)
+
+    def close(self):
+        pass
+
+
+def get_unit_of_work():
+    """Retourne l'unité de travail de la requête courante (créée à la demande), ou None hors requête."""
+    if not has_request_context():
+        return None
+    uow = g.get("_db_unit_of_work")
+    if uow is None or uow.done:
+        uow = UnitOfWork()
+        g._db_unit_of_work = uow
+    return uow
+
+
+def on_commit(callback):
+    """
+    Exécute `callback` après la validation de la transaction courante :
+    en fin de requête dans Flask, immédiatement ailleurs (cron, workers).
+    """
+    uow = get_unit_of_work()
+    if uow is None:
+        callback()
+    else:
+        uow.on_commit(callback)
+
+
+def get_connection():
+    """
+    Emprunte une connexion au pool du process.
+    S'utilise comme avant : `with get_connection() as conn` (commit/rollback puis retour au pool).
+    Pendant une requête Flask, renvoie la connexion partagée de la requête.
+    """
+    uow = get_unit_of_work()
+    if uow is not None:
+        return RequestConnection(uow)
+    return get_pool().connection()
+
+
+def _finish_request(response):
+    uow = g.get("_db_unit_of_work")
+    if uow is None or uow.done:
+        return response
+
+    try:
+        if uow.failed and response.status_code < 500:
+            # les écritures de la requête sont perdues : ne pas annoncer un succès
+            logger.error("transaction de la requête annulée après une erreur", {
+                "origin": "DB_UNIT_OF_WORK",
+                "status_code": response.status_code
+            })
+            response, _ = error_response(
+                message="erreur lors de l'enregistrement en base",
+                code="DB_TRANSACTION_FAILED",
+                status_code=500,
+            )
+            response.status_code = 500
+
+        if uow.failed or response.status_code >= 500:
+            uow.rollback()
+        else:
+            uow.commit()
+    except Exception as e:
+        logger.error("erreur lors de la validation de la transaction de la requête", {
+            "origin": "DB_UNIT_OF_WORK",
+            "error": str(e)
+        })
+        uow.fail()
+        response, _ = error_response(
+            message="erreur lors de l'enregistrement en base",
+            code="DB_COMMIT_ERROR",
+            status_code=500,
+        )
+        response.status_code = 500
+    finally:
+        uow.close()
+    return response
+
+
+def _teardown_request(exc=None):
+    uow = g.pop("_db_unit_of_work", None)
+    if uow is None or uow.done:
+        return
+    try:
+        uow.rollback()
+    except Exception:
+        pass
+    finally:
+        uow.close()
+
+
+def init_db(app):
+    """Branche l'unité de travail par requête sur l'application Flask."""
+    app.after_request(_finish_request)
+    app.teardown_appcontext(_teardown_request)
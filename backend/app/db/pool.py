@@ -0,0 +1,249 @@
+# app/db/pool.py
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from app.utils.logger import log_backend as logger
+
+
+class PoolTimeout(PoolError):
+    """Levée quand aucune connexion ne se libère avant la fin du délai d'attente."""
+
+
+class PooledConnection:
+    """
+    Proxy autour d'une connexion psycopg2 empruntée au pool.
+
+    Garde la même forme d'appel que `psycopg2.connect()` :
+    - `with get_connection() as conn` commit en sortie normale, rollback sur exception,
+      puis rend la connexion au pool (au lieu de la laisser ouverte).
+    - `conn.close()` rend la connexion au pool.
+    Tout le reste (`cursor()`, `commit()`, ...) est délégué à la vraie connexion.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise psycopg2.InterfaceError("connexion déjà rendue au pool")
+        return getattr(raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._raw is not None and not self._raw.closed:
+                if exc_type is None:
+                    self._raw.commit()
+                else:
+                    self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.putconn(raw)
+
+
+class ConnectionPool:
+    """
+    Pool de connexions PostgreSQL thread-safe.
+
+    - `min_size` connexions sont ouvertes dès le premier emprunt et gardées au repos.
+    - au plus `max_size` connexions ouvertes en même temps ; au-delà, l'appelant attend
+      jusqu'à `timeout` secondes qu'une connexion se libère, puis `PoolTimeout`.
+    - une connexion plus vieille que `max_lifetime` secondes est fermée au lieu d'être réutilisée.
+    - une connexion restée au repos plus de `health_check_idle` secondes est testée
+      (`SELECT 1`) avant d'être rendue à l'appelant.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800, timeout=10, health_check_idle=30):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("tailles de pool invalides")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (raw, created_at, released_at)
+        self._created_at = {}  # id(raw) -> created_at
+        self._opened = 0
+        self._pid = os.getpid()
+        self._filled = False
+        self._closed = False
+
+    # --- ouverture / fermeture bas niveau ---
+
+    def _open(self):
+        raw = self._connect()
+        with self._lock:
+            self._created_at[id(raw)] = time.monotonic()
+        return raw
+
+    def _discard(self, raw):
+        with self._lock:
+            self._created_at.pop(id(raw), None)
+            self._opened -= 1
+            self._lock.notify()
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime and now - created_at > self.max_lifetime
+
+    def _is_healthy(self, raw, released_at, now):
+        if raw.closed:
+            return False
+        if now - released_at < self.health_check_idle:
+            return True
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _check_fork(self):
+        # Après un fork (gunicorn), les sockets du parent ne doivent pas être partagées
+        if self._pid != os.getpid():
+            with self._lock:
+                self._idle.clear()
+                self._created_at.clear()
+                self._opened = 0
+                self._filled = False
+                self._pid = os.getpid()
+
+    def _fill(self):
+        with self._lock:
+            if self._filled:
+                return
+            self._filled = True
+            missing = max(0, self.min_size - self._opened)
+            self._opened += missing
+
+        for _ in range(missing):
+            try:
+                raw = self._open()
+            except Exception as e:
+                with self._lock:
+                    self._opened -= 1
+                logger.warning("impossible de pré-remplir le pool de connexions", {
+                    "origin": "DB_POOL",
+                    "error": str(e)
+                })
+                break
+            with self._lock:
+                self._idle.append((raw, self._created_at[id(raw)], time.monotonic()))
+                self._lock.notify()
+
+    # --- API publique ---
+
+    def getconn(self, timeout=None):
+        if self._closed:
+            raise PoolError("pool de connexions fermé")
+
+        self._check_fork()
+        self._fill()
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                while not self._idle and self._opened >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"aucune connexion disponible après {timeout}s (max {self.max_size})")
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    raw, created_at, released_at = self._idle.pop()
+                else:
+                    raw = None
+                    self._opened += 1
+
+            if raw is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                        self._lock.notify()
+                    raise
+
+            now = time.monotonic()
+            if self._expired(created_at, now) or not self._is_healthy(raw, released_at, now):
+                self._discard(raw)
+                continue
+
+            return raw
+
+    def putconn(self, raw):
+        if self._pid != os.getpid():
+            return
+
+        created_at = self._created_at.get(id(raw))
+        if created_at is None:
+            # Connexion inconnue du pool (déjà jetée), on la ferme simplement
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+
+        if not raw.closed and raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                raw.rollback()
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        if (
+            self._closed
+            or raw.closed
+            or raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+            or self._expired(created_at, now)
+        ):
+            self._discard(raw)
+            return
+
+        with self._lock:
+            self._idle.append((raw, created_at, now))
+            self._lock.notify()
+
+    def connection(self, timeout=None):
+        return PooledConnection(self, self.getconn(timeout))
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "in_use": self._opened - len(self._idle),
+                "max_size": self.max_size,
+            }
@@ -2,7 +2,7 @@ from flask import request, g
 from app.utils.response import success_response, error_response, warning_response
 from app.utils.validators import require_auth
 from app.db.connection import get_connection
-from app.services.verifications import verify_calendar
+from app.services.verifications import verify_calendar, invalidate_calendar_access
 from app.services.user import fetch_user
 from app.services.notifications import notify_and_record
 import time
@@ -97,6 +97,7 @@ def handle_send_invitation(calendar_id):
                     """,
                     (receiver_uid, calendar_id, False, "edit")
                 )
+                invalidate_calendar_access(calendar_id, receiver_uid)
 
                 t_1 = time.time()
 
@@ -163,6 +164,7 @@ def handle_accept_invitation(notification_id):
                     """,
                     (receiver_uid, calendar_id)
                 )
+                invalidate_calendar_access(calendar_id, receiver_uid)
                 
                 # Dire que la notif a été lue
                 cursor.execute(
@@ -267,6 +269,7 @@ def handle_reject_invitation(notification_id):
                     """,
                     (receiver_uid, calendar_id)
                 )
+                invalidate_calendar_access(calendar_id, receiver_uid)
 
                 t_1 = time.time()
 
@@ -1,114 +1,94 @@
 from . import api
 from app.utils.validators import require_auth
 from app.utils.response import success_response, error_response, warning_response
-from app.services.user import fetch_user
-from app.services.calendar_service import fetch_medicine_name
+from app.services.user import fetch_users
+from app.services.calendar_service import fetch_calendar_names, fetch_medicine_names
 from app.db.connection import get_connection
 from flask import request, g
 import time
 from app.auth.fcm import send_fcm_notification
 from app.config import Config
 from urllib.parse import urljoin
-from app.services.notifications import notify_and_record
+from app.services.notifications import notify_and_record, fetch_notifications_page, count_unread_notifications
 
 frontend_url = Config.FRONTEND_URL or ""
 
 
 DEFAULT_PHOTO = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/icons/person-circle.svg"
+DEFAULT_NOTIFICATIONS_LIMIT = 50
+MAX_NOTIFICATIONS_LIMIT = 200
 
-def safely_get_calendar_name(calendar_id):
-    with get_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM calendars WHERE id = %s", (calendar_id,))
-            calendar = cursor.fetchone()
-            if calendar:
-                return calendar.get("name")
-            else:
-                return None
-    return None
-
-def get_user_info(uid):
-    user = fetch_user(uid)
-    return user.get("display_name"), user.get("email"), user.get("photo_url")
-
-# Route pour récupérer toutes les notifications
+# Route pour récupérer les notifications, page par page (du plus récent au plus ancien)
+# - `limit` : taille de la page (défaut 50, max 200)
+# - `cursor` : `next_cursor` de la page précédente
+# - `unread` : `true` pour ne garder que les non lues
 @api.route("/notifications", methods=["GET"])
 @require_auth
 def handle_notifications():
     try:
         t_0 = time.time()
         uid = g.uid
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM notifications WHERE user_id = %s", (uid,))
-                notifications_data = cursor.fetchall()
-
-                if notifications_data is None:
-                    return success_response(
-                        message="aucune notification trouvée",
-                        code="NOTIFICATIONS_FETCH_SUCCESS",
-                        uid=uid,
-                        origin="NOTIFICATIONS_FETCH",
-                        data={"notifications": []}
-                    )
 
-                calendar_name_cache = {}
-                sender_info_cache = {}
-                medication_name_cache = {}
-                notifications = []
-                t_1 = time.time()
+        try:
+            limit = int(request.args.get("limit", DEFAULT_NOTIFICATIONS_LIMIT))
+            if limit < 1 or limit > MAX_NOTIFICATIONS_LIMIT:
+                raise ValueError(f"la limite doit être comprise entre 1 et {MAX_NOTIFICATIONS_LIMIT}")
+            unread_only = request.args.get("unread", "").lower() in ("1", "true")
+            notifications_data, next_cursor = fetch_notifications_page(uid, limit, request.args.get("cursor"), unread_only)
+        except ValueError as e:
+            return warning_response(
+                message="paramètres de pagination invalides",
+                code="INVALID_PAGINATION",
+                status_code=400,
+                uid=uid,
+                origin="NOTIFICATIONS_FETCH",
+                log_extra={"error": str(e)}
+            )
 
-                for notif in notifications_data:
-                    json_body = notif.get("content") or {}
-                    sender_uid = notif.get("sender_uid")
-                    calendar_id = json_body.get("calendar_id")
-                    link = json_body.get("link") if json_body.get("link") else None
-                    medication_id = json_body.get("medication_id") if json_body.get("medication_id") else None
-                    medication_qty = json_body.get("medication_qty") if json_body.get("medication_qty") else None
-
-                    if not calendar_id:
-                        continue
-
-                    if medication_id:
-                        if medication_id not in medication_name_cache:
-                            medication_name_cache[medication_id] = fetch_medicine_name(medication_id)
-                        medication_name = medication_name_cache[medication_id]
-                    else:
-                        medication_name = None
-
-                    # Cache calendar name
-                    if calendar_id not in calendar_name_cache:
-                        calendar_name_cache[calendar_id] = safely_get_calendar_name(calendar_id)
-                    calendar_name = calendar_name_cache[calendar_id]
-
-                    # Cache sender info
-                    if sender_uid not in sender_info_cache:
-                        sender_info_cache[sender_uid] = get_user_info(sender_uid)
-                    sender_name, sender_email, sender_photo_url = sender_info_cache[sender_uid]
-
-                    notifications.append({
-                        "notification_id": notif.get("id"),
-                        "notification_type": notif.get("type"),
-                        "read": notif.get("read"),
-                        "timestamp": notif.get("timestamp"),
-                        "calendar_id": calendar_id,
-                        "calendar_name": calendar_name,
-                        "sender_name": sender_name,
-                        "sender_email": sender_email,
-                        "sender_photo_url": sender_photo_url or DEFAULT_PHOTO,
-                        "link" : link,
-                        "medication_name": medication_name,
-                        "medication_qty": medication_qty,
-                    })
-                t_2 = time.time()
+        t_1 = time.time()
+
+        # noms des calendriers, expéditeurs et médicaments de la page : une requête par type
+        contents = [notif.get("content") or {} for notif in notifications_data]
+        calendar_names = fetch_calendar_names(content.get("calendar_id") for content in contents)
+        medication_names = fetch_medicine_names(content.get("medication_id") for content in contents)
+        senders = fetch_users(notif.get("sender_uid") for notif in notifications_data if notif.get("sender_uid"))
+        notifications = []
+
+        for notif in notifications_data:
+            json_body = notif.get("content") or {}
+            sender_uid = notif.get("sender_uid")
+            calendar_id = json_body.get("calendar_id")
+            link = json_body.get("link") if json_body.get("link") else None
+            medication_id = json_body.get("medication_id") if json_body.get("medication_id") else None
+            medication_qty = json_body.get("medication_qty") if json_body.get("medication_qty") else None
+
+            medication_name = medication_names.get(str(medication_id), "unknown") if medication_id else None
+            calendar_name = calendar_names.get(str(calendar_id))
+            sender = senders.get(str(sender_uid)) or {}
+
+            notifications.append({
+                "notification_id": notif.get("id"),
+                "notification_type": notif.get("type"),
+                "read": notif.get("read"),
+                "timestamp": notif.get("timestamp"),
+                "calendar_id": calendar_id,
+                "calendar_name": calendar_name,
+                "sender_name": sender.get("display_name"),
+                "sender_email": sender.get("email"),
+                "sender_photo_url": sender.get("photo_url") or DEFAULT_PHOTO,
+                "link" : link,
+                "medication_name": medication_name,
+                "medication_qty": medication_qty,
+            })
+        t_2 = time.time()
 
         return success_response(
             message="notifications récupérées",
             code="NOTIFICATIONS_FETCH_SUCCESS",
             uid=uid,
             origin="NOTIFICATIONS_FETCH",
-            data={"notifications": notifications},
-            log_extra={"time": t_2 - t_0, "time_append": t_2 - t_1}
+            data={"notifications": notifications, "next_cursor": next_cursor},
+            log_extra={"count": len(notifications), "time": t_2 - t_0, "time_append": t_2 - t_1}
         )
 
     except Exception as e:
@@ -121,6 +101,35 @@ def handle_notifications():
             error=str(e)
         )
 
+# Route pour récupérer le nombre de notifications non lues
+@api.route("/notifications/unread-count", methods=["GET"])
+@require_auth
+def handle_unread_notifications_count():
+    try:
+        t_0 = time.time()
+        uid = g.uid
+        unread_count = count_unread_notifications(uid)
+        t_1 = time.time()
+
+        return success_response(
+            message="nombre de notifications non lues récupéré",
+            code="NOTIFICATIONS_UNREAD_COUNT_SUCCESS",
+            uid=uid,
+            origin="NOTIFICATIONS_UNREAD_COUNT",
+            data={"unread_count": unread_count},
+            log_extra={"time": t_1 - t_0}
+        )
+
+    except Exception as e:
+        return error_response(
+            message="erreur lors du comptage des notifications non lues",
+            code="NOTIFICATIONS_UNREAD_COUNT_ERROR",
+            status_code=500,
+            uid=uid,
+            origin="NOTIFICATIONS_UNREAD_COUNT",
+            error=str(e)
+        )
+
 # Route pour marquer une notification comme lue
 @api.route("/notifications/<notification_id>", methods=["POST"])
 @require_auth
@@ -239,26 +248,38 @@ def send_notification():
                         uid=uid, 
                         origin="FCM_SEND"
                     )
-                tokens = [result.get("token") for result in results]
-                status_code, result_data = send_fcm_notification(tokens=tokens, title=title, body=body, json_body=json_body)
+                # même dédoublonnage que send_fcm_notification, pour comparer le nombre d'échecs
+                tokens = list(dict.fromkeys(result.get("token") for result in results))
+                errors = send_fcm_notification(tokens=tokens, title=title, body=body, json_body=json_body)
 
 
-        if status_code == 200:
+        # succès si au moins un appareil a reçu la notification
+        if len(errors) < len(tokens):
             return success_response(
                 message="notification envoyée", 
                 code="NOTIFICATION_SENT", 
                 uid=uid, 
                 origin="FCM_SEND",
-                log_extra={"response": result_data}
+                log_extra={"errors": errors}
+            )
+        elif all(error.get("unregistered") for error in errors):
+            # tous les appareils sont désinscrits (tokens supprimés) : pas une erreur serveur
+            return warning_response(
+                message="aucun appareil enregistré", 
+                code="NO_VALID_TOKEN", 
+                status_code=404, 
+                uid=uid, 
+                origin="FCM_SEND",
+                log_extra={"errors": errors}
             )
         else:
             return error_response(
                 message="erreur lors de l'envoi de la notification", 
                 code="FCM_V1_ERROR", 
-                status_code=status_code, 
+                status_code=502, 
                 uid=uid, 
                 origin="FCM_SEND",
-                error=result_data
+                error=str(errors)
             )
 
     except Exception as e:
@@ -1,12 +1,12 @@
 from . import api
 from app.utils.validators import require_auth
-from datetime import datetime, timezone
 from flask import request, g, Response
 from app.db.connection import get_connection
-from app.services.calendar_service import generate_calendar_schedule
-from app.services.verifications import verify_calendar
+from app.services.calendar_service import generate_calendar_schedule, parse_schedule_range, schedule_response_data, fetch_accessible_calendar
+from app.services.verifications import verify_calendar, invalidate_calendar_access, invalidate_token
+from app.services.schedule_snapshots import invalidate_schedule_snapshots
 import time
-from app.utils.response import success_response, error_response, warning_response
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
 from app.utils.logger import log_backend
 from app.services.pdf import generate_medicine_conditions_pdf
 from app.utils.validators import decode_token
@@ -23,7 +23,22 @@ def handle_calendars():
         uid = g.uid
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM calendars WHERE owner_uid = %s", (uid,))
+                # empreinte légère de la liste (ids + versions) : rien d'autre à faire si le client l'a déjà
+                cursor.execute("""
+                    SELECT COUNT(*) AS count, md5(COALESCE(string_agg(id::text || ':' || version, ',' ORDER BY id), '')) AS fingerprint
+                    FROM calendars WHERE owner_uid = %s
+                """, (uid,))
+                fingerprint = cursor.fetchone()
+                etag = make_etag("calendars", uid, fingerprint.get("count"), fingerprint.get("fingerprint"))
+                if etag_matches(etag):
+                    return not_modified_response(etag)
+
+                # calendriers + nombre de boîtes en une seule requête
+                cursor.execute("""
+                    SELECT c.*, (SELECT COUNT(*) FROM medicine_boxes mb WHERE mb.calendar_id = c.id) AS boxes_count
+                    FROM calendars c
+                    WHERE c.owner_uid = %s
+                """, (uid,))
                 calendars = cursor.fetchall()
 
                 if calendars is None:
@@ -34,10 +49,6 @@ def handle_calendars():
                         uid=uid, 
                         origin="CALENDAR_FETCH", 
                     )
-                for calendar in calendars:
-                    cursor.execute("SELECT COUNT(*) FROM medicine_boxes WHERE calendar_id = %s", (calendar["id"],))
-                    boxes_count = cursor.fetchone()
-                    calendar["boxes_count"] = boxes_count.get("count", 0) if boxes_count else 0
 
 
         t_1 = time.time()
@@ -47,7 +58,8 @@ def handle_calendars():
             uid=uid, 
             origin="CALENDAR_FETCH", 
             data={"calendars": calendars},
-            log_extra={"time": t_1 - t_0}
+            log_extra={"time": t_1 - t_0},
+            etag=etag
         )
     except Exception as e:
         return error_response(
@@ -137,7 +149,17 @@ def handle_delete_calendar():
                         log_extra={"calendar_id": calendar_id, "time": t_1 - t_0}
                     )
 
+                # partages supprimés explicitement pour connaître les utilisateurs dont les droits changent
+                cursor.execute("DELETE FROM shared_calendars WHERE calendar_id = %s RETURNING receiver_uid", (calendar_id,))
+                receiver_uids = [row.get("receiver_uid") for row in cursor.fetchall()]
+                # liens de partage du calendrier : leur résolution en cache ne doit plus aboutir
+                cursor.execute("SELECT id FROM shared_tokens WHERE calendar_id = %s", (calendar_id,))
+                token_ids = [row.get("id") for row in cursor.fetchall()]
                 cursor.execute("DELETE FROM calendars WHERE id = %s", (calendar_id,))
+                invalidate_schedule_snapshots(cursor, calendar_id, refresh=False)
+                invalidate_calendar_access(calendar_id, uid, *receiver_uids)
+                for token_id in token_ids:
+                    invalidate_token(token_id)
                 conn.commit()
         t_2 = time.time()
         return success_response(
@@ -216,9 +238,10 @@ def handle_rename_calendar():
                         log_extra={"calendar_id": calendar_id, "old_calendar_name": old_name, "new_calendar_name": new_calendar_name}
                     )
                 cursor.execute(
-                    "UPDATE calendars SET name = %s WHERE id = %s",
+                    "UPDATE calendars SET name = %s, version = version + 1 WHERE id = %s",
                     (new_calendar_name, calendar_id)
                 )
+                invalidate_schedule_snapshots(cursor, calendar_id)
                 conn.commit()
 
         t_1 = time.time()
@@ -248,13 +271,21 @@ def handle_calendar_schedule(calendar_id):
         t_0 = time.time()
         owner_uid = g.uid
 
-        start_date = request.args.get("startTime")
-        if not start_date:
-            start_date = datetime.now(timezone.utc).date()
-        else:
-            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        try:
+            start_date, weeks = parse_schedule_range(request.args)
+        except ValueError as e:
+            return warning_response(
+                message="période invalide",
+                code="INVALID_SCHEDULE_RANGE",
+                status_code=400,
+                uid=owner_uid,
+                origin="CALENDAR_GENERATE",
+                log_extra={"calendar_id": calendar_id, "error": str(e)}
+            )
 
-        if not verify_calendar(calendar_id, owner_uid):
+        # droit d'accès + version (ETag) en une seule requête
+        calendar = fetch_accessible_calendar(calendar_id, owner_uid, "owner")
+        if not calendar:
             return warning_response(
                 message="accès refusé", 
                 code="ACCESS_DENIED", 
@@ -264,7 +295,11 @@ def handle_calendar_schedule(calendar_id):
                 log_extra={"calendar_id": calendar_id}
             )
 
-        schedule, table, calendar_name = generate_calendar_schedule(calendar_id, start_date)
+        etag = make_etag("calendar-schedule", calendar_id, calendar.get("version"), start_date, weeks)
+        if etag_matches(etag):
+            return not_modified_response(etag)
+
+        schedule, tables, calendar_name = generate_calendar_schedule(calendar_id, start_date, weeks, calendar=calendar)
 
         t_1 = time.time()
 
@@ -273,8 +308,9 @@ def handle_calendar_schedule(calendar_id):
             code="CALENDAR_GENERATE_SUCCESS", 
             uid=owner_uid, 
             origin="CALENDAR_GENERATE", 
-            data={"schedule": schedule, "table": table, "calendar_name": calendar_name},
-            log_extra={"calendar_id": calendar_id, "time": t_1 - t_0}
+            data=schedule_response_data(schedule, tables, calendar_name),
+            log_extra={"calendar_id": calendar_id, "weeks": weeks, "time": t_1 - t_0},
+            etag=etag
         )
 
     except Exception as e:
@@ -4,7 +4,8 @@ import time
 from . import api
 from app.services.verifications import verify_calendar
 from app.services.medicines import update_box, create_box, delete_box, get_boxes
-from app.utils.response import success_response, error_response, warning_response
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
+from app.services.calendar_service import fetch_accessible_calendar
 from app.services.pillulier import use_pillulier
 from datetime import datetime, timezone
 
@@ -18,7 +19,9 @@ def handle_boxes(calendar_id):
         t_0 = time.time()
         uid = g.uid
 
-        if not verify_calendar(calendar_id, uid):
+        # droit d'accès + version (ETag) en une seule requête
+        calendar = fetch_accessible_calendar(calendar_id, uid, "owner")
+        if not calendar:
             return warning_response(
                 message=ERROR_UNAUTHORIZED_ACCESS,
                 code="UNAUTHORIZED_ACCESS",
@@ -27,6 +30,11 @@ def handle_boxes(calendar_id):
                 origin="GET_MEDICINE_BOXES",
                 log_extra={"calendar_id": calendar_id}
             )
+
+        etag = make_etag("boxes", calendar_id, calendar.get("version"))
+        if etag_matches(etag):
+            return not_modified_response(etag)
+
         boxes = get_boxes(calendar_id)
         t_1 = time.time()
 
@@ -36,7 +44,8 @@ def handle_boxes(calendar_id):
             uid=uid,
             origin="GET_MEDICINE_BOXES",
             data={"boxes": boxes},
-            log_extra={"time": t_1 - t_0, "calendar_id": calendar_id, "boxes_count": len(boxes) if boxes is not None else 0}
+            log_extra={"time": t_1 - t_0, "calendar_id": calendar_id, "boxes_count": len(boxes) if boxes is not None else 0},
+            etag=etag
         )
 
     except Exception as e:
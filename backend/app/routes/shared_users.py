@@ -1,12 +1,11 @@
 from app.utils.validators import require_auth
-from datetime import datetime, timezone
 from . import api
-from app.services.verifications import verify_calendar_share
-from app.services.calendar_service import generate_calendar_schedule
+from app.services.verifications import verify_calendar_share, invalidate_calendar_access
+from app.services.calendar_service import generate_calendar_schedule, parse_schedule_range, schedule_response_data, fetch_accessible_calendar
 from flask import request, g
 import time
 from app.services.user import fetch_user
-from app.utils.response import success_response, error_response, warning_response
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
 from app.db.connection import get_connection
 from app.services.notifications import notify_and_record
 import json
@@ -18,6 +17,7 @@ ERROR_UNAUTHORIZED_ACCESS = "accès refusé"
 SUCCESS_SHARED_CALENDARS_LOAD = "calendriers partagés récupérés"
 
 SELECT_SHARED_CALENDAR = "SELECT * FROM calendars WHERE id = %s"
+DEFAULT_PHOTO_URL = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/icons/person-circle.svg"
 
 # Route pour récupérer les calendriers partagés
 @api.route("/shared/users/calendars", methods=["GET"])
@@ -29,89 +29,47 @@ def handle_shared_calendars():
 
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM shared_calendars WHERE receiver_uid = %s AND accepted = true", (uid,))
-                shared_users = cursor.fetchall()
+                # partages acceptés + calendrier + propriétaire + nombre de boîtes en une seule requête
+                cursor.execute("""
+                    SELECT
+                        sc.calendar_id AS id,
+                        c.name,
+                        c.owner_uid,
+                        u.display_name AS owner_name,
+                        u.email AS owner_email,
+                        u.photo_url AS owner_photo_url,
+                        COALESCE(sc.access, 'read') AS access,
+                        (SELECT COUNT(*) FROM medicine_boxes mb WHERE mb.calendar_id = c.id) AS boxes_count
+                    FROM shared_calendars sc
+                    JOIN calendars c ON c.id = sc.calendar_id
+                    LEFT JOIN users u ON u.id = c.owner_uid
+                    WHERE sc.receiver_uid = %s AND sc.accepted = true
+                """, (uid,))
+                calendars_list = cursor.fetchall()
                 t_1 = time.time()
 
-                if not shared_users:
-                    return success_response(
-                        message=SUCCESS_SHARED_CALENDARS_LOAD,
-                        code="SHARED_CALENDARS_LOAD_EMPTY", 
-                        uid=uid,
-                        origin="SHARED_CALENDARS_LOAD",
-                        data={"calendars": []},
-                        log_extra={"time": t_1 - t_0}
-                    )
-
-                calendars_list = []
-                for shared_user in shared_users:
-
-                    calendar_id = shared_user.get("calendar_id")
-                    access = shared_user.get("access", "read")
-
-                    # Récupère le calendrier nom du calendrier et le nom de l'owner
-                    cursor.execute(SELECT_SHARED_CALENDAR, (calendar_id,))
-                    calendar = cursor.fetchone()
-                    if not calendar:
-                        return warning_response(
-                            message=ERROR_CALENDAR_NOT_FOUND,
-                            code="SHARED_CALENDARS_LOAD_ERROR",
-                            status_code=404,
-                            uid=uid,
-                            origin="SHARED_CALENDARS_LOAD",
-                            log_extra={"calendar_id": calendar_id}
-                        )
-                    owner_uid = calendar.get("owner_uid")
-
-                    # Récupère le nombre de médicaments
-                    cursor.execute("SELECT COUNT(*) FROM medicine_boxes WHERE calendar_id = %s", (calendar_id,))
-                    boxes_count = cursor.fetchone()
-                    boxes_count = boxes_count.get("count", 0) if boxes_count else 0
-
-                    calendar_name = calendar.get("name")
-
-                    # Récupère les infos de l'owner
-                    owner = fetch_user(owner_uid)
-                    if owner is None:
-                        return warning_response(
-                            message="utilisateur partagé non trouvé",
-                            code="SHARED_CALENDARS_LOAD_ERROR",
-                            status_code=404,
-                            uid=uid,
-                            origin="SHARED_CALENDARS_LOAD",
-                            log_extra={"calendar_id": calendar_id, "calendar_name": calendar_name}
-                        )
-                    owner_name = owner.get("display_name")
-                    owner_email = owner.get("email")
-                    owner_photo_url = owner.get("photo_url")
-                    if not owner_photo_url:
-                        owner_photo_url = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/icons/person-circle.svg"
-
-                    if not verify_calendar_share(calendar_id, uid):
-                        continue
-
-                    # Ajoute les infos à la réponse
-                    calendars_list.append({
-                        "id": calendar_id,
-                        "name": calendar_name,
-                        "owner_uid": owner_uid,
-                        "owner_name": owner_name,
-                        "owner_photo_url": owner_photo_url,
-                        "owner_email": owner_email,
-                        "access": access,
-                        "boxes_count": boxes_count
-                    })
+        if not calendars_list:
+            return success_response(
+                message=SUCCESS_SHARED_CALENDARS_LOAD,
+                code="SHARED_CALENDARS_LOAD_EMPTY", 
+                uid=uid,
+                origin="SHARED_CALENDARS_LOAD",
+                data={"calendars": []},
+                log_extra={"time": t_1 - t_0}
+            )
 
-                t_2 = time.time()
+        for calendar in calendars_list:
+            if not calendar.get("owner_photo_url"):
+                calendar["owner_photo_url"] = DEFAULT_PHOTO_URL
 
-                return success_response(
-                    message=SUCCESS_SHARED_CALENDARS_LOAD, 
-                    code="SHARED_CALENDARS_LOAD_SUCCESS", 
-                    uid=uid, 
-                    origin="SHARED_CALENDARS_LOAD",
-                    data={"calendars": calendars_list},
-                    log_extra={"time": t_2 - t_0}
-                )
+        return success_response(
+            message=SUCCESS_SHARED_CALENDARS_LOAD, 
+            code="SHARED_CALENDARS_LOAD_SUCCESS", 
+            uid=uid, 
+            origin="SHARED_CALENDARS_LOAD",
+            data={"calendars": calendars_list},
+            log_extra={"time": t_1 - t_0}
+        )
 
     except Exception as e:
         return error_response(
@@ -200,7 +158,9 @@ def handle_user_shared_calendar_schedule(calendar_id):
         t_0 = time.time()
         uid = g.uid
 
-        if not verify_calendar_share(calendar_id, uid):
+        # droit d'accès (partage) + version (ETag) en une seule requête
+        calendar = fetch_accessible_calendar(calendar_id, uid, "shared")
+        if not calendar:
             return warning_response(
                 message=ERROR_UNAUTHORIZED_ACCESS,
                 code="SHARED_CALENDARS_LOAD_ERROR",
@@ -210,13 +170,23 @@ def handle_user_shared_calendar_schedule(calendar_id):
                 log_extra={"calendar_id": calendar_id}
             )
 
-        start_date = request.args.get("startTime")
-        if not start_date:
-            start_date = datetime.now(timezone.utc).date()
-        else:
-            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        try:
+            start_date, weeks = parse_schedule_range(request.args)
+        except ValueError as e:
+            return warning_response(
+                message="période invalide",
+                code="INVALID_SCHEDULE_RANGE",
+                status_code=400,
+                uid=uid,
+                origin="SHARED_CALENDARS_LOAD",
+                log_extra={"calendar_id": calendar_id, "error": str(e)}
+            )
+
+        etag = make_etag("shared-schedule", calendar_id, calendar.get("version"), start_date, weeks)
+        if etag_matches(etag):
+            return not_modified_response(etag)
 
-        schedule, table, calendar_name = generate_calendar_schedule(calendar_id, start_date)
+        schedule, tables, calendar_name = generate_calendar_schedule(calendar_id, start_date, weeks, calendar=calendar)
 
         t_1 = time.time()
             
@@ -225,8 +195,9 @@ def handle_user_shared_calendar_schedule(calendar_id):
             code="SHARED_CALENDARS_LOAD_SUCCESS", 
             uid=uid, 
             origin="SHARED_CALENDARS_LOAD",
-            data={"schedule": schedule, "table": table, "calendar_name": calendar_name},
-            log_extra={"calendar_id": calendar_id, "time": t_1 - t_0}
+            data=schedule_response_data(schedule, tables, calendar_name),
+            log_extra={"calendar_id": calendar_id, "weeks": weeks, "time": t_1 - t_0},
+            etag=etag
         )
 
     except Exception as e:
@@ -276,6 +247,7 @@ def handle_delete_user_shared_calendar(calendar_id):
 
                 owner_uid = calendar.get("owner_uid")
                 cursor.execute("DELETE FROM shared_calendars WHERE receiver_uid = %s AND calendar_id = %s", (receiver_uid, calendar_id))
+                invalidate_calendar_access(calendar_id, receiver_uid)
                 link = urljoin(Config.FRONTEND_URL or "", "/calendars")
 
                 notify_and_record(
@@ -342,6 +314,7 @@ def handle_delete_user_shared_user(calendar_id, receiver_uid):
 
                 cursor.execute("DELETE FROM shared_calendars WHERE receiver_uid = %s AND calendar_id = %s", (receiver_uid, calendar_id))
                 row = cursor.rowcount
+                invalidate_calendar_access(calendar_id, receiver_uid)
                 if row == 0:
                     return warning_response(
                         message=ERROR_CALENDAR_NOT_FOUND,
@@ -449,7 +422,7 @@ def handle_shared_users(calendar_id):
                     receiver_email = receiver.get("email")
 
                     if not receiver_photo_url:
-                        receiver_photo_url = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/icons/person-circle.svg"
+                        receiver_photo_url = DEFAULT_PHOTO_URL
 
                     if not verify_calendar_share(calendar_id, receiver_uid):
                         continue
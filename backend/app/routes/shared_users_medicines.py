@@ -1,7 +1,8 @@
 from flask import request, g
 from app.utils.validators import require_auth
 from . import api
-from app.utils.response import success_response, error_response, warning_response
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
+from app.services.calendar_service import fetch_accessible_calendar
 from app.services.verifications import verify_calendar_share
 from app.services.medicines import get_boxes, update_box, create_box, delete_box
 import time
@@ -18,7 +19,9 @@ def handle_shared_boxes(calendar_id):
         t_0 = time.time()
         receiver_uid = g.uid
 
-        if not verify_calendar_share(calendar_id, receiver_uid):
+        # droit d'accès (partage) + version (ETag) en une seule requête
+        calendar = fetch_accessible_calendar(calendar_id, receiver_uid, "shared")
+        if not calendar:
             return warning_response(
                 message=ERROR_CALENDAR_NOT_FOUND,
                 code="SHARED_USER_CALENDAR_BOXES_LOAD_ERROR",
@@ -28,6 +31,10 @@ def handle_shared_boxes(calendar_id):
                 log_extra={"calendar_id": calendar_id}
             )
 
+        etag = make_etag("boxes", calendar_id, calendar.get("version"))
+        if etag_matches(etag):
+            return not_modified_response(etag)
+
         boxes = get_boxes(calendar_id)
         t_1 = time.time()
 
@@ -37,7 +44,8 @@ def handle_shared_boxes(calendar_id):
             uid=receiver_uid,
             origin="GET_MEDICINE_BOXES",
             data={"boxes": boxes},
-            log_extra={"time": t_1 - t_0, "calendar_id": calendar_id, "boxes_count": len(boxes)}
+            log_extra={"time": t_1 - t_0, "calendar_id": calendar_id, "boxes_count": len(boxes)},
+            etag=etag
         )
 
     except Exception as e:
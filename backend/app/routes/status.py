@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from . import api
 from app.utils.logger import log_backend as logger
+from app.utils.validators import jwt_cache_stats
 
 @api.route('/status', methods=['GET', 'HEAD'])
 def status():
@@ -9,7 +10,10 @@ def status():
             "origin": "STATUS",
         })
         return '', 200
+    # compteurs du process qui répond (cache mémoire propre à chaque worker)
+    caches = {"jwt": jwt_cache_stats()}
     logger.info("Requête GET reçue sur /api/status", {
         "origin": "STATUS",
+        "caches": caches,
     })
-    return jsonify({"status": "ok"}), 200
+    return jsonify({"status": "ok", "caches": caches}), 200
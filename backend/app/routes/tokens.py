@@ -1,14 +1,18 @@
-from app.utils.response import success_response, error_response, warning_response
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
 from app.utils.validators import require_auth
-from datetime import datetime, timezone
+from datetime import datetime
 from . import api
 import time
 from flask import request, g
-from app.db.connection import get_connection
-from app.services.calendar_service import generate_calendar_schedule
-from app.services.verifications import verify_calendar, verify_token_owner, verify_token
+from app.db.connection import get_connection, on_commit
+from app.services.calendar_service import generate_calendar_schedule, parse_schedule_range, schedule_response_data, fetch_shared_calendar_version
+from app.services.verifications import verify_calendar, verify_token_owner, verify_token, invalidate_token
+from app.services.schedule_snapshots import fetch_schedule_snapshot, schedule_snapshot_refresh, snapshot_covers
+from app.config import Config
 
 ERROR_UNAUTHORIZED_ACCESS = "accès refusé"
+# le planning d'un lien de partage est le même pour tous : navigateurs et proxys peuvent le resservir
+TOKEN_SCHEDULE_CACHE_CONTROL = f"public, max-age={Config.TOKEN_SCHEDULE_MAX_AGE}"
 
 # Route pour récupérer tous les tokens et les informations associées
 @api.route("/tokens", methods=["GET"])
@@ -89,6 +93,8 @@ def handle_create_token(calendar_id):
                     """,
                     (calendar_id, expires_at, permissions, False, owner_uid)
                 )
+                # le planning public est pré-généré dès la création du lien
+                on_commit(lambda: schedule_snapshot_refresh(calendar_id))
                 t_1 = time.time()
 
                 return success_response(
@@ -132,6 +138,7 @@ def handle_update_revoke_token(token):
         with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("UPDATE shared_tokens SET revoked = not revoked WHERE id = %s AND owner_uid = %s", (token, owner_uid))
+                invalidate_token(token)
 
                 cursor.execute("SELECT revoked FROM shared_tokens WHERE id = %s AND owner_uid = %s", (token, owner_uid))
                 revoked = cursor.fetchone()
@@ -188,6 +195,7 @@ def handle_update_token_expiration(token):
         with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("UPDATE shared_tokens SET expires_at = %s WHERE id = %s AND owner_uid = %s", (expires_at, token, owner_uid))
+                invalidate_token(token)
 
                 t_1 = time.time()
 
@@ -236,6 +244,7 @@ def handle_update_token_permissions(token):
         with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("UPDATE shared_tokens SET permissions = %s WHERE id = %s AND owner_uid = %s", (permissions, token, owner_uid))
+                invalidate_token(token)
 
                 t_1 = time.time()
 
@@ -266,11 +275,17 @@ def handle_generate_token_schedule(token):
     try:
         t_0 = time.time()
 
-        start_date = request.args.get("startTime")
-        if not start_date:
-            start_date = datetime.now(timezone.utc).date()
-        else:
-            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        try:
+            start_date, weeks = parse_schedule_range(request.args)
+        except ValueError as e:
+            return warning_response(
+                message="période invalide",
+                code="INVALID_SCHEDULE_RANGE",
+                status_code=400,
+                uid="unknown",
+                origin="TOKEN_GENERATE_SCHEDULE",
+                log_extra={"token": token, "error": str(e)}
+            )
 
         calendar_id = verify_token(token)
         if not calendar_id:
@@ -283,7 +298,33 @@ def handle_generate_token_schedule(token):
                 log_extra={"token": token}
             )
 
-        schedule, table, calendar_name = generate_calendar_schedule(calendar_id, start_date)
+        # lecture directe des snapshots ; sinon génération classique et régénération en arrière-plan
+        snapshot = fetch_schedule_snapshot(calendar_id, token, start_date, weeks)
+        if snapshot is not None:
+            schedule, tables, calendar_name, version = snapshot
+        else:
+            # token revérifié en base : le cache de résolution peut être en retard sur une révocation
+            version = fetch_shared_calendar_version(calendar_id, token)
+            if version is None:
+                invalidate_token(token)
+                return warning_response(
+                    message="token invalide", 
+                    code="TOKEN_INVALID", 
+                    status_code=404, 
+                    uid="unknown", 
+                    origin="TOKEN_GENERATE_SCHEDULE", 
+                    log_extra={"token": token}
+                )
+            schedule = None
+            if snapshot_covers(start_date, weeks):
+                schedule_snapshot_refresh(calendar_id)
+
+        etag = make_etag("token-schedule", calendar_id, version, start_date, weeks)
+        if etag_matches(etag):
+            return not_modified_response(etag, cache_control=TOKEN_SCHEDULE_CACHE_CONTROL)
+
+        if schedule is None:
+            schedule, tables, calendar_name = generate_calendar_schedule(calendar_id, start_date, weeks)
         
         t_1 = time.time()
 
@@ -292,8 +333,10 @@ def handle_generate_token_schedule(token):
             code="TOKEN_GENERATE_SCHEDULE_SUCCESS", 
             uid="unknown", 
             origin="TOKEN_GENERATE_SCHEDULE", 
-            data={"schedule": schedule, "table": table, "calendar_name": calendar_name},
-            log_extra={"token": token, "time": t_1 - t_0}
+            data=schedule_response_data(schedule, tables, calendar_name),
+            log_extra={"token": token, "weeks": weeks, "snapshot": snapshot is not None, "time": t_1 - t_0},
+            etag=etag,
+            cache_control=TOKEN_SCHEDULE_CACHE_CONTROL
         )
     except Exception as e:
         return error_response(
@@ -383,6 +426,7 @@ def handle_delete_token(token):
         with get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM shared_tokens WHERE id = %s", (token,))
+                invalidate_token(token)
                 t_1 = time.time()   
 
                 return success_response(
@@ -1,8 +1,9 @@
 from . import api
 import time
 from app.db.connection import get_connection
-from app.services.verifications import verify_token
-from app.utils.response import success_response, error_response, warning_response
+from app.services.verifications import verify_token, invalidate_token
+from app.utils.response import success_response, error_response, warning_response, make_etag, etag_matches, not_modified_response
+from app.services.calendar_service import fetch_shared_calendar_version
 
 
 # Route pour obtenir les médicaments d’un token public
@@ -20,7 +21,23 @@ def handle_token_medicines(token):
                 origin="TOKEN_MEDICINES_LOAD",
                 log_extra={"token": token}
             )
-            
+
+        # token revérifié en base : le cache de résolution peut être en retard sur une révocation
+        version = fetch_shared_calendar_version(calendar_id, token)
+        if version is None:
+            invalidate_token(token)
+            return warning_response(
+                message="token invalide",
+                code="TOKEN_INVALID",
+                status_code=404,
+                uid="unknown",
+                origin="TOKEN_MEDICINES_LOAD",
+                log_extra={"token": token}
+            )
+
+        etag = make_etag("token-medicines", calendar_id, version)
+        if etag_matches(etag):
+            return not_modified_response(etag)
 
         with get_connection() as conn:
             with conn.cursor() as cursor:
@@ -45,7 +62,8 @@ def handle_token_medicines(token):
             code="MEDICINES_SHARED_LOADED",
             origin="TOKEN_MEDICINES_LOAD",
             data={"medicines": medicines},
-            log_extra={"token": token, "time": t_1 - t_0}
+            log_extra={"token": token, "time": t_1 - t_0},
+            etag=etag
         )
 
     except Exception as e:
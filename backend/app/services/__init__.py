@@ -1,7 +1,10 @@
 from .calendar_service import *
+from .schedule_snapshots import *
+from .recurrence import *
 from .medicines import *
 from .user import *
 from .pdf import *
+from .outbox import *
 from .notifications import *
 from .pillulier import *
 from .verifications import *
@@ -1,33 +1,187 @@
-from datetime import timedelta, date
+from datetime import timedelta, datetime, timezone
 from app.utils.logger import log_backend as logger
+from app.config.config import Config
 from app.db.connection import get_connection
+from app.services.recurrence import first_due_date, iter_due_dates
+from app.utils.cache import create_cache
+
+MAX_SCHEDULE_WEEKS = 53 # au plus un an par requête
+
+
+def parse_schedule_range(args):
+    """
+    Lit la période demandée dans les paramètres de requête et la ramène à des semaines entières.
+    - `startTime` ou `start` (YYYY-MM-DD, défaut : aujourd'hui) : la période commence le lundi de cette date
+    - `end` (YYYY-MM-DD, inclus) ou `weeks` (nombre de semaines, défaut 1)
+    Retourne (lundi de départ, nombre de semaines). Lève ValueError si les paramètres sont invalides.
+    """
+    start = args.get("start") or args.get("startTime")
+    if start:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    else:
+        start_date = datetime.now(timezone.utc).date()
+    monday = start_date - timedelta(days=start_date.weekday())
+
+    end = args.get("end")
+    weeks = args.get("weeks")
+    if end:
+        end_date = datetime.strptime(end, "%Y-%m-%d").date()
+        if end_date < start_date:
+            raise ValueError("la date de fin précède la date de début")
+        weeks = (end_date - monday).days // 7 + 1
+    elif weeks:
+        weeks = int(weeks)
+    else:
+        weeks = 1
+
+    if weeks < 1 or weeks > MAX_SCHEDULE_WEEKS:
+        raise ValueError(f"la période doit faire entre 1 et {MAX_SCHEDULE_WEEKS} semaines")
+
+    return monday, weeks
+
+
+# Planning d'une semaine par (calendrier, version, lundi) : la version change à chaque
+# modification des boîtes / conditions / nom, donc une entrée n'est jamais périmée.
+_schedule_cache = create_cache(
+    "schedule",
+    max_entries=Config.SCHEDULE_CACHE_MAX_ENTRIES,
+    ttl=Config.SCHEDULE_CACHE_TTL,
+)
+
+
+def schedule_cache_key(calendar_id, version, week_start):
+    return f"{calendar_id}:{version}:{week_start.isoformat()}"
+
+
+def bump_calendar_version(cursor, calendar_id):
+    """Invalide les caches du calendrier (à appeler dans la même transaction que la modification)."""
+    cursor.execute("UPDATE calendars SET version = version + 1 WHERE id = %s", (calendar_id,))
+
+
+def fetch_shared_calendar_version(calendar_id, token):
+    """
+    Version du calendrier pour les ETag des liens de partage, ou None si le token n'est plus actif
+    (révoqué, supprimé, propriétaire changé) : revérifié en base à chaque appel, le cache de
+    résolution des tokens pouvant être propre au worker.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.version
+                FROM calendars c
+                JOIN shared_tokens t ON t.calendar_id = c.id AND t.owner_uid = c.owner_uid
+                WHERE c.id = %s AND t.id = %s AND NOT t.revoked
+            """, (calendar_id, token))
+            calendar = cursor.fetchone()
+            return calendar.get("version") if calendar else None
+
+
+# Prédicats d'accès réutilisés dans les requêtes de données (alias `c` = calendars)
+ACCESS_PREDICATES = {
+    "owner": "c.owner_uid = %(uid)s",
+    "shared": "EXISTS (SELECT 1 FROM shared_calendars sc WHERE sc.calendar_id = c.id AND sc.receiver_uid = %(uid)s)",
+}
 
-def generate_calendar_schedule(calendar_id, start_date):
+
+def fetch_accessible_calendar(calendar_id, uid, role="owner"):
+    """
+    Calendrier (id, name, version) si `uid` y a accès comme `role` (`owner` ou `shared`), sinon None.
+    Une seule requête répond à la fois au droit d'accès et aux données utiles (version pour l'ETag).
+    """
     try:
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM calendars WHERE id = %s", (calendar_id,))
-                calendar = cursor.fetchone()
+                cursor.execute(f"""
+                    SELECT c.id, c.name, c.version
+                    FROM calendars c
+                    WHERE c.id = %(calendar_id)s AND {ACCESS_PREDICATES[role]}
+                """, {"calendar_id": calendar_id, "uid": uid})
+                return cursor.fetchone()
+    except Exception as e:
+        logger.error("erreur lors de la vérification de l'accès au calendrier", {
+            "origin": "CALENDAR_VERIFY_ERROR",
+            "uid": uid,
+            "calendar_id": calendar_id,
+            "error": str(e)
+        })
+        return None
+
+
+def load_schedule_weeks(cursor, calendar, week_starts):
+    """
+    Planning de chaque semaine de `week_starts` pour `calendar` ({id, version}) :
+    {lundi: {"has_medicines", "schedule", "table"}}. Les semaines absentes du cache
+    sont générées à partir d'une seule lecture des conditions.
+    """
+    calendar_id = calendar.get("id")
+    version = calendar.get("version", 0)
+    weeks_data = {
+        week_start: _schedule_cache.get(schedule_cache_key(calendar_id, version, week_start))
+        for week_start in week_starts
+    }
+    missing = [week_start for week_start, data in weeks_data.items() if data is None]
+
+    if missing:
+        cursor.execute("""
+            SELECT 
+                cond.*,
+                box.name,
+                box.dose
+            FROM medicine_box_conditions cond
+            JOIN medicine_boxes box ON cond.box_id = box.id
+            WHERE box.calendar_id = %s
+        """, (calendar_id,))
+        medicines = cursor.fetchall()
+
+        for week_start in missing:
+            week = {
+                "has_medicines": bool(medicines),
+                "schedule": generate_schedule(week_start, medicines),
+                "table": generate_table(week_start, medicines),
+            }
+            _schedule_cache.set(schedule_cache_key(calendar_id, version, week_start), week)
+            weeks_data[week_start] = week
+
+    return weeks_data
+
+
+def assemble_schedule(weeks_data, week_starts, calendar_name):
+    """Assemble les semaines chargées en (événements, tableaux par semaine, nom du calendrier)."""
+    if not any(weeks_data[week_start]["has_medicines"] for week_start in week_starts):
+        return [], [], None
+
+    # les semaines sont triées et disjointes : la concaténation reste triée
+    schedule = [event for week_start in week_starts for event in weeks_data[week_start]["schedule"]]
+    tables = [
+        {"week_start": week_start.isoformat(), "table": weeks_data[week_start]["table"]}
+        for week_start in week_starts
+    ]
+    return schedule, tables, calendar_name
+
+
+def generate_calendar_schedule(calendar_id, start_date, weeks=1, calendar=None):
+    """
+    Génère le planning de `weeks` semaines à partir du lundi de `start_date`.
+    Les semaines déjà en cache pour la version courante du calendrier ne sont pas recalculées ;
+    les autres sont générées à partir d'une seule lecture des conditions.
+    `calendar` (déjà chargé, ex. par fetch_accessible_calendar) évite de relire le calendrier.
+    Retourne (événements, tableaux par semaine, nom du calendrier).
+    """
+    monday = start_date - timedelta(days=start_date.weekday())
+    week_starts = [monday + timedelta(weeks=week) for week in range(weeks)]
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                if calendar is None:
+                    cursor.execute("SELECT id, name, version FROM calendars WHERE id = %s", (calendar_id,))
+                    calendar = cursor.fetchone()
                 if calendar is None:
                     return [], [], None
 
-                cursor.execute("""
-                    SELECT 
-                        cond.*,
-                        box.name,
-                        box.dose
-                    FROM medicine_box_conditions cond
-                    JOIN medicine_boxes box ON cond.box_id = box.id
-                    WHERE box.calendar_id = %s
-                """, (calendar_id,))
-
-                medicines = cursor.fetchall()
-                if medicines:
-                    schedule = generate_schedule(start_date, medicines)
-                    table = generate_table(start_date, medicines)
-                    return schedule, table, calendar.get("name")
-                else:
-                    return [], [], None
+                weeks_data = load_schedule_weeks(cursor, calendar, week_starts)
+
+        return assemble_schedule(weeks_data, week_starts, calendar.get("name"))
 
     except Exception as e:
         logger.error("erreur lors de la génération du calendrier", {
@@ -37,21 +191,19 @@ def generate_calendar_schedule(calendar_id, start_date):
         return [], [], None
 
 
-def is_medication_due(med, current_date):
-    try:
-        start_date = med.get("start_date", "")
-        if isinstance(start_date, date):
-            sd = start_date
-        else:
-            sd = current_date
-
-
-        delta_days = (current_date - sd).days
+def schedule_response_data(schedule, tables, calendar_name):
+    """Données renvoyées par les routes de planning : `table` reste celui de la première semaine."""
+    return {
+        "schedule": schedule,
+        "table": tables[0]["table"] if tables else [],
+        "tables": tables,
+        "calendar_name": calendar_name,
+    }
 
-        if delta_days < 0:
-            return False
 
-        return delta_days % med["interval_days"] == 0
+def is_medication_due(med, current_date):
+    try:
+        return first_due_date(med, current_date, current_date) is not None
     except Exception as e:
         logger.error(f"erreur lors de la vérification de la date de prise du médicament: {e}", {
             "origin": "MEDICATION_DUE_ERROR",
@@ -60,48 +212,40 @@ def is_medication_due(med, current_date):
         return False
 
 
+# format pour fullcalendar : heure de la prise et couleur par moment de la journée
+EVENT_TIMES = {
+    "morning": ("08:00:00", "#f87171"), # rouge clair
+    "noon": ("12:00:00", "#34d399"), # vert clair
+    "evening": ("18:00:00", "#60a5fa"), # bleu clair
+}
+
+
 def generate_schedule(start_date, medications):
+    """Événements d'une semaine (lundi de `start_date` au dimanche)."""
     monday = start_date - timedelta(days=start_date.weekday())
-
-    total_day = 7 # Nombre de jours à afficher (1 semaine)
+    last_day = monday + timedelta(days=6)
     schedule = []
 
-    for i in range(total_day):
-        current_date = monday + timedelta(days=i)
-        for med in medications:
-            if is_medication_due(med, current_date):
-                # format pour fullcalendar
-
-                name = med.get('name')
-                tablet_count = med.get('tablet_count')
-                dose = med.get('dose', None)
-
-                if med["time_of_day"] == "morning":
-                    pils_data = {
-                        "title" : name,
-                        "start" : current_date.strftime("%Y-%m-%dT08:00:00"),
-                        "color" : "#f87171", # rouge clair
-                        "tablet_count" : tablet_count,
-                        "dose" : dose
-                    }
-                elif med["time_of_day"] == "noon":
-                    pils_data = {
-                        "title" : name,
-                        "start" : current_date.strftime("%Y-%m-%dT12:00:00"),
-                        "color" : "#34d399", # vert clair
-                        "tablet_count" : tablet_count,
-                        "dose" : dose
-                    }
-                elif med["time_of_day"] == "evening":
-                    pils_data = {
-                        "title" : name,
-                        "start" : current_date.strftime("%Y-%m-%dT18:00:00"),
-                        "color" : "#60a5fa", # bleu clair
-                        "tablet_count" : tablet_count,
-                        "dose" : dose
-                    }
-                schedule.append(pils_data)
-                
+    for med in medications:
+        event_time = EVENT_TIMES.get(med.get("time_of_day"))
+        if event_time is None:
+            continue
+        hour, color = event_time
+
+        name = med.get('name')
+        tablet_count = med.get('tablet_count')
+        dose = med.get('dose', None)
+
+        # uniquement les jours de prise, sans parcourir toute la période
+        for current_date in iter_due_dates(med, monday, last_day):
+            schedule.append({
+                "title" : name,
+                "start" : f"{current_date.isoformat()}T{hour}",
+                "color" : color,
+                "tablet_count" : tablet_count,
+                "dose" : dose
+            })
+
     # trier les événements par date et par alphabet
     schedule.sort(key=lambda x: (x["start"], x["title"]))
     return schedule
@@ -151,12 +295,9 @@ def generate_table(start_date, medications):
 
 def build_medication_table(med, monday, total_day):
     table = {}
+    last_day = monday + timedelta(days=total_day - 1)
 
-    for i in range(total_day):
-        current_date = monday + timedelta(days=i)
-        if not is_medication_due(med, current_date):
-            continue
-
+    for current_date in iter_due_dates(med, monday, last_day):
         day = current_date.strftime("%a")
         moment = med["time_of_day"]
         if moment not in table:
@@ -199,4 +340,24 @@ def fetch_medicine_name(medication_id):
             cursor.execute("SELECT name FROM medicine_boxes WHERE id = %s", (medication_id,))
             result = cursor.fetchone() or {}
             return result.get("name", "unknown")
+
+def fetch_calendar_names(calendar_ids):
+    """Noms de plusieurs calendriers en une requête. Retourne {id: nom}."""
+    calendar_ids = tuple({str(calendar_id) for calendar_id in calendar_ids if calendar_id})
+    if not calendar_ids:
+        return {}
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM calendars WHERE id IN %s", (calendar_ids,))
+            return {str(calendar.get("id")): calendar.get("name") for calendar in cursor.fetchall()}
+
+def fetch_medicine_names(medication_ids):
+    """Noms de plusieurs boîtes en une requête. Retourne {id: nom}."""
+    medication_ids = tuple({str(medication_id) for medication_id in medication_ids if medication_id})
+    if not medication_ids:
+        return {}
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM medicine_boxes WHERE id IN %s", (medication_ids,))
+            return {str(box.get("id")): box.get("name") for box in cursor.fetchall()}
     
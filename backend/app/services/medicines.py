@@ -1,6 +1,12 @@
 from app.db.connection import get_connection
+from app.services.calendar_service import bump_calendar_version
+from app.services.schedule_snapshots import invalidate_schedule_snapshots
 
 def get_boxes(calendar_id):
+    """
+    Boîtes du calendrier avec leurs conditions et l'URL de leur notice.
+    Trois requêtes au total quel que soit le nombre de boîtes, assemblées en mémoire.
+    """
     with get_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -10,18 +16,35 @@ def get_boxes(calendar_id):
             WHERE c.id = %s
             """, (calendar_id,))
             boxes = cursor.fetchall()
-            for box in boxes:
-                cursor.execute("SELECT * FROM medicine_box_conditions WHERE box_id = %s", (box.get("id"),))
-                conditions = cursor.fetchall()
-                box["conditions"] = conditions
-                cursor.execute("SELECT url_notice_fr FROM medicaments_afmps WHERE name ilike %s", (box.get("name"),))
-                url_notice_fr = cursor.fetchone()
-                if url_notice_fr:
-                    box["url_notice_fr"] = url_notice_fr.get("url_notice_fr")
-                else:
-                    box["url_notice_fr"] = None
-    if not boxes:
-        return []
+            if not boxes:
+                return []
+
+            # toutes les conditions du calendrier en une fois
+            cursor.execute("""
+                SELECT cond.*
+                FROM medicine_box_conditions cond
+                JOIN medicine_boxes mb ON mb.id = cond.box_id
+                WHERE mb.calendar_id = %s
+            """, (calendar_id,))
+            conditions_by_box = {}
+            for condition in cursor.fetchall():
+                conditions_by_box.setdefault(condition.get("box_id"), []).append(condition)
+
+            # une notice par nom de boîte (même correspondance ILIKE qu'avant)
+            names = list({box.get("name") for box in boxes if box.get("name")})
+            notices = {}
+            if names:
+                cursor.execute("""
+                    SELECT DISTINCT ON (n.name) n.name, m.url_notice_fr
+                    FROM unnest(%s::text[]) AS n(name)
+                    JOIN medicaments_afmps m ON m.name ILIKE n.name
+                    ORDER BY n.name
+                """, (names,))
+                notices = {row.get("name"): row.get("url_notice_fr") for row in cursor.fetchall()}
+
+    for box in boxes:
+        box["conditions"] = conditions_by_box.get(box.get("id"), [])
+        box["url_notice_fr"] = notices.get(box.get("name"))
     return boxes
 
 def update_box(box_id, calendar_id, data):
@@ -34,11 +57,23 @@ def update_box(box_id, calendar_id, data):
 
     with get_connection() as conn:
         with conn.cursor() as cursor:
+            # boîte réapprovisionnée au-dessus du seuil : le prochain passage sous le seuil sera de nouveau alerté
             cursor.execute("""
                 UPDATE medicine_boxes 
-                SET name = %s, dose = %s, box_capacity = %s, stock_alert_threshold = %s, stock_quantity = %s 
-                WHERE id = %s AND calendar_id = %s
-            """, (name, dose, box_capacity, stock_alert_threshold, stock_quantity, box_id, calendar_id))
+                SET name = %(name)s, dose = %(dose)s, box_capacity = %(box_capacity)s,
+                    stock_alert_threshold = %(threshold)s, stock_quantity = %(quantity)s,
+                    low_stock_alerted_at = CASE WHEN %(quantity)s::int > %(threshold)s::int THEN NULL ELSE low_stock_alerted_at END,
+                    low_stock_alerted_qty = CASE WHEN %(quantity)s::int > %(threshold)s::int THEN NULL ELSE low_stock_alerted_qty END
+                WHERE id = %(box_id)s AND calendar_id = %(calendar_id)s
+            """, {
+                "name": name,
+                "dose": dose,
+                "box_capacity": box_capacity,
+                "threshold": stock_alert_threshold,
+                "quantity": stock_quantity,
+                "box_id": box_id,
+                "calendar_id": calendar_id,
+            })
             cursor.execute("DELETE FROM medicine_box_conditions WHERE box_id = %s", (box_id,))
             if conditions:
                 for condition in conditions:
@@ -47,6 +82,8 @@ def update_box(box_id, calendar_id, data):
                         (id, box_id, tablet_count, interval_days, start_date, time_of_day)
                         VALUES (%s, %s, %s, %s, %s, %s)
                     """, (condition.get("id"), box_id, condition.get("tablet_count"), condition.get("interval_days"), condition.get("start_date"), condition.get("time_of_day")))
+            bump_calendar_version(cursor, calendar_id)
+            invalidate_schedule_snapshots(cursor, calendar_id)
             conn.commit()
 
 def create_box(calendar_id, data):
@@ -65,6 +102,8 @@ def create_box(calendar_id, data):
             """, (calendar_id, name, dose, box_capacity, stock_alert_threshold, stock_quantity))
             box = cursor.fetchone()
             box_id = box.get("id")
+            bump_calendar_version(cursor, calendar_id)
+            invalidate_schedule_snapshots(cursor, calendar_id)
             conn.commit()
 
     return box_id
@@ -74,6 +113,8 @@ def delete_box(box_id, calendar_id):
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM medicine_boxes WHERE id = %s AND calendar_id = %s", (box_id, calendar_id))
             cursor.execute("DELETE FROM medicine_box_conditions WHERE box_id = %s", (box_id,))
+            bump_calendar_version(cursor, calendar_id)
+            invalidate_schedule_snapshots(cursor, calendar_id)
             conn.commit()
 
 def get_medicines_for_calendar(calendar_id):
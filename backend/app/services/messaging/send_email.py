@@ -1,35 +1,167 @@
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
 from email.utils import formataddr
 from app.utils.logger import log_backend
 from app.config import Config
 
-def send_email(to, subject, html_content, plain=None):
-    try:
-        html = f"""
-            <div style="font-family: Arial, sans-serif; background-color: #f9f9f9; padding: 24px;">
-                <div style="max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 8px rgba(0,0,0,0.05);">
-                    <div style="background-color: #007bff; padding: 16px; text-align: center;">
-                        <img src="https://meditime-app.com/icons/logo_white.png" alt="MediTime Logo" style="height: 100px;" />
-                    </div>
-                    <div style="padding: 24px;">
-                        <h2 style="color: #333;">{subject}</h2>
-                        {html_content}
-                    </div>
-                </div>
-            </div>
-            """
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["From"] = formataddr(("MediTime", Config.NOTIFICATION_EMAIL_ADDRESS or ""))
-        msg["To"] = to
-        msg.set_content(plain or "Ce message contient du HTML.")
-        msg.add_alternative(html, subtype="html")
-
-        with smtplib.SMTP(Config.SMTP_HOST or "", int(Config.SMTP_PORT or 465)) as server:
+
+class SmtpPool:
+    """
+    Petit pool de sessions SMTP authentifiées (STARTTLS + login faits une seule fois).
+    Une session inactive depuis un moment est vérifiée par NOOP avant d'être réutilisée.
+    """
+
+    def __init__(self, max_size=2, noop_after=30, timeout=15):
+        self.max_size = max_size
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self._idle = []  # [(session, last_used)]
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        server = smtplib.SMTP(Config.SMTP_HOST or "", int(Config.SMTP_PORT or 465), timeout=self.timeout)
+        try:
             server.starttls()
             server.login(Config.NOTIFICATION_EMAIL_ADDRESS or "", Config.NOTIFICATION_EMAIL_PASSWORD or "")
-            server.send_message(msg)
-        log_backend.info(f"Email sent to {to} with subject '{subject}'", {"origin": "EMAIL", "code": "EMAIL_SENT"})
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.noop_after or self._is_alive(server):
+                return server
+            self._close(server)
+        return self._connect()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("aucune session SMTP disponible")
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def reconnect(self, server):
+        """Remplace une session coupée par une nouvelle (garde le même slot)."""
+        self._close(server)
+        return self._connect()
+
+    def release(self, server, discard=False):
+        try:
+            if discard:
+                self._close(server)
+            else:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+_smtp_pool = SmtpPool(
+    max_size=Config.SMTP_POOL_SIZE,
+    noop_after=Config.SMTP_NOOP_AFTER,
+    timeout=Config.SMTP_TIMEOUT,
+)
+
+
+def build_email(to, subject, html_content, plain=None):
+    html = f"""
+        <div style="font-family: Arial, sans-serif; background-color: #f9f9f9; padding: 24px;">
+            <div style="max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 8px rgba(0,0,0,0.05);">
+                <div style="background-color: #007bff; padding: 16px; text-align: center;">
+                    <img src="https://meditime-app.com/icons/logo_white.png" alt="MediTime Logo" style="height: 100px;" />
+                </div>
+                <div style="padding: 24px;">
+                    <h2 style="color: #333;">{subject}</h2>
+                    {html_content}
+                </div>
+            </div>
+        </div>
+        """
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = formataddr(("MediTime", Config.NOTIFICATION_EMAIL_ADDRESS or ""))
+    msg["To"] = to
+    msg.set_content(plain or "Ce message contient du HTML.")
+    msg.add_alternative(html, subtype="html")
+    return msg
+
+
+def send_emails(emails):
+    """
+    Envoie plusieurs emails sur une même session SMTP.
+    `emails` : liste de dict {to, subject, html_content, plain}. Retourne un résultat par email, dans l'ordre.
+    """
+    results = []
+    if not emails:
+        return results
+
+    try:
+        server = _smtp_pool.acquire()
     except Exception as e:
-        log_backend.error(f"Error sending email: {e}", {"origin": "EMAIL", "code": "EMAIL_ERROR", "error": str(e)})
\ No newline at end of file
+        log_backend.error(f"Error connecting to SMTP: {e}", {"origin": "EMAIL", "code": "EMAIL_ERROR", "error": str(e)})
+        return [{"success": False, "error": str(e)} for _ in emails]
+
+    healthy = True
+    for email in emails:
+        to = email.get("to")
+        subject = email.get("subject")
+        try:
+            msg = build_email(to, subject, email.get("html_content"), email.get("plain"))
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # session coupée par le serveur : on en ouvre une nouvelle et on réessaie une fois
+                server = _smtp_pool.reconnect(server)
+                server.send_message(msg)
+            healthy = True
+            log_backend.info(f"Email sent to {to} with subject '{subject}'", {"origin": "EMAIL", "code": "EMAIL_SENT"})
+            results.append({"success": True})
+        except smtplib.SMTPRecipientsRefused as e:
+            # adresse refusée : la session reste utilisable
+            log_backend.error(f"Error sending email: {e}", {"origin": "EMAIL", "code": "EMAIL_ERROR", "error": str(e)})
+            results.append({"success": False, "error": str(e)})
+        except Exception as e:
+            healthy = False
+            log_backend.error(f"Error sending email: {e}", {"origin": "EMAIL", "code": "EMAIL_ERROR", "error": str(e)})
+            results.append({"success": False, "error": str(e)})
+
+    _smtp_pool.release(server, discard=not healthy)
+    return results
+
+
+def send_email(to, subject, html_content, plain=None):
+    return send_emails([{"to": to, "subject": subject, "html_content": html_content, "plain": plain}])[0]
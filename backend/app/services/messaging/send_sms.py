@@ -1,12 +1,56 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from app.config import Config
 from app.utils.logger import log_backend
 
+_client = None
+_client_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Limite le nombre d'appels par seconde (seau à jetons partagé par tous les threads)."""
+
+    def __init__(self, rate_per_second):
+        self.rate = max(rate_per_second, 0.1)
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiter = RateLimiter(Config.SMS_RATE_PER_SECOND)
+
+
+def get_twilio_client():
+    """Client Twilio unique pour le process (session HTTP keep-alive réutilisée)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = TwilioHttpClient(pool_connections=True, timeout=Config.TWILIO_TIMEOUT)
+                _client = Client(Config.TWILIO_API_KEY_SID, Config.TWILIO_API_KEY_SECRET, http_client=http_client)
+    return _client
+
 
 def send_sms(to_number, message_body):
     try:
-        client = Client(Config.TWILIO_API_KEY_SID, Config.TWILIO_API_KEY_SECRET)
-        message = client.messages.create(
+        _rate_limiter.acquire()
+        message = get_twilio_client().messages.create(
             to=to_number,
             messaging_service_sid=Config.TWILIO_MESSAGING_SERVICE_SID,
             body=message_body
@@ -16,3 +60,17 @@ def send_sms(to_number, message_body):
         log_backend.error(f"Error sending SMS to {to_number}: {e}", {"origin": "SMS", "code": "SMS_ERROR"})
         return {"success": False, "error": str(e)}
     return {"success": True, "sid": message.sid, "status": message.status}
+
+
+def send_sms_batch(messages):
+    """
+    Envoie plusieurs SMS en parallèle (SMS_MAX_WORKERS à la fois, SMS_RATE_PER_SECOND au plus).
+    `messages` : liste de (numéro, texte). Retourne un résultat par SMS, dans l'ordre.
+    """
+    if not messages:
+        return []
+    if len(messages) == 1:
+        return [send_sms(*messages[0])]
+
+    with ThreadPoolExecutor(max_workers=min(Config.SMS_MAX_WORKERS, len(messages)), thread_name_prefix="sms") as executor:
+        return list(executor.map(lambda message: send_sms(*message), messages))
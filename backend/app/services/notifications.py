@@ -1,126 +1,194 @@
 # app/services/notifications.py
+import base64
 import json
+from itertools import groupby
+from urllib.parse import urljoin
+from psycopg2.extras import execute_values
 from app.auth.fcm import send_fcm_notification
 from app.db.connection import get_connection
-from app.services.calendar_service import fetch_calendar, fetch_medicine_name
+from app.services.calendar_service import fetch_medicine_name
 from app.utils.logger import log_backend
 from app.services.user import fetch_user
-from app.services.messaging import send_email, send_sms
+from app.services.messaging import send_emails, send_sms_batch
+from app.services.outbox import enqueue_notification, enqueue_notifications
 from app.config import Config
 import traceback
 
-def fetch_user_name(uid):
-    user = fetch_user(uid)
-    return user.get("display_name") if user else "un utilisateur"
+NOTIFICATION_CONTEXT_SQL = """
+    SELECT
+        to_jsonb(r) AS recipient,
+        (SELECT display_name FROM users WHERE id = %(sender_uid)s) AS sender_name,
+        (SELECT name FROM calendars WHERE id = %(calendar_id)s) AS calendar_name,
+        (SELECT name FROM medicine_boxes WHERE id = %(medication_id)s) AS medication_name
+    FROM (SELECT 1) AS one
+    LEFT JOIN users r ON r.id = %(uid)s
+"""
 
-def fetch_calendar_name(calendar_id):
-    calendar = fetch_calendar(calendar_id)
-    return calendar.get("name") if calendar else "unknown"
-
-def send_push_notification(uid, json_body, notif_type):
-    with get_connection() as conn:
-        with conn.cursor() as cursor:
-            # 1. Chercher le token FCM
-            cursor.execute("SELECT token FROM fcm_tokens WHERE uid = %s", (uid,))
-            tokens = [r["token"] for r in cursor.fetchall()]
-
-            match notif_type:
-                case "calendar_invitation":
-                    title = "Nouvelle invitation à un calendrier"
-                    body = f"{json_body.get('sender_name')} vous invite à rejoindre le calendrier « {json_body.get('calendar_name') } »."
-                case "calendar_invitation_accepted":
-                    title = "Invitation acceptée"
-                    body = f"{json_body.get('sender_name')} a accepté votre invitation pour rejoindre le calendrier « {json_body.get('calendar_name') } »."
-                case "calendar_invitation_rejected":
-                    title = "Invitation refusée"
-                    body = f"{json_body.get('sender_name')} a refusé votre invitation pour rejoindre le calendrier « {json_body.get('calendar_name') } »."
-                case "calendar_shared_deleted_by_owner":
-                    title = "Partage annulé"
-                    body = f"{json_body.get('sender_name')} a arrêté de partager le calendrier « {json_body.get('calendar_name') } » avec vous."
-                case "calendar_shared_deleted_by_receiver":
-                    title = "Partage retiré"
-                    body = f"{json_body.get('sender_name')} a retiré le calendrier « {json_body.get('calendar_name') } »."
-                case "low_stock":
-                    name = fetch_medicine_name(json_body.get("medication_id"))
-                    qty = json_body.get("medication_qty") or 0
-                    title = "Stock faible"
-                    body = f"Le médicament « {name} » est presque épuisé ({qty} restants)."
-                case _:
-                    title = "Nouvelle notification"
-                    body = "Vous avez reçu une nouvelle notification dans MediTime."
-
-            # 2. Envoyer la notif (si token trouvé)
-            if tokens:
-                send_fcm_notification(tokens, title, body, json_body)
-            else:
-                log_backend.warning(
-                    f"Aucun token FCM trouvé pour l'utilisateur {uid}", 
-                    {
-                        "origin": "NOTIFICATIONS", 
-                        "code": "NO_FCM_TOKEN", 
-                        "uid": uid,
-                    }
-                )
-
-def send_email_notification(uid, json_body, notif_type):
-    user = fetch_user(uid)
-    email = user.get("email") if user else None
-
-    subject, plain_body, html_content = generate_email_content(notif_type, json_body)
-
-    if email:
-        send_email(
-            to=email,
-            subject=subject,
-            html_content=html_content,
-            plain=plain_body    
-        )
-
-def send_sms_notification(uid, json_body, notif_type):
-    user = fetch_user(uid)
-    phone = user.get("phone") if user else None
+def fetch_notification_context(cursor, uid, json_body):
+    """
+    Charge en une requête tout ce qu'il faut pour une notification : destinataire (réglages),
+    nom de l'expéditeur, du calendrier et du médicament. Complète `json_body` et retourne le destinataire.
+    """
+    calendar_id = json_body.get("calendar_id")
+    medication_id = json_body.get("medication_id")
 
-    subject, plain_body, html_content = generate_email_content(notif_type, json_body)
+    cursor.execute(NOTIFICATION_CONTEXT_SQL, {
+        "uid": uid,
+        "sender_uid": json_body.get("sender_uid"),
+        "calendar_id": calendar_id,
+        "medication_id": medication_id,
+    })
+    context = cursor.fetchone() or {}
 
-    if phone:
-        send_sms(phone, plain_body)
-    else:
-        log_backend.warning(
-            f"Aucun numéro de téléphone trouvé pour l'utilisateur {uid}", 
-            {
-                "origin": "NOTIFICATIONS", 
-                "code": "NO_PHONE_NUMBER", 
-                "uid": uid,
-            }
-        )   
+    json_body["calendar_name"] = (context.get("calendar_name") or "unknown") if calendar_id else None
+    json_body["sender_name"] = context.get("sender_name") or "un utilisateur"
+    if medication_id:
+        json_body["medication_name"] = context.get("medication_name") or "unknown"
 
-def generate_email_content(notif_type, json_body):
-    base_link = f"https://{Config.FRONTEND_URL}/notifications"
+    return context.get("recipient") or {}
 
+def render_notification(notif_type, json_body):
+    """Titre et texte d'une notification, communs à tous les canaux."""
     match notif_type:
         case "calendar_invitation":
-            subject = "Nouvelle invitation à un calendrier"
+            title = "Nouvelle invitation à un calendrier"
             body = f"{json_body.get('sender_name')} vous invite à rejoindre le calendrier « {json_body.get('calendar_name') } »."
         case "calendar_invitation_accepted":
-            subject = "Invitation acceptée"
+            title = "Invitation acceptée"
             body = f"{json_body.get('sender_name')} a accepté votre invitation pour rejoindre le calendrier « {json_body.get('calendar_name') } »."
         case "calendar_invitation_rejected":
-            subject = "Invitation refusée"
+            title = "Invitation refusée"
             body = f"{json_body.get('sender_name')} a refusé votre invitation pour rejoindre le calendrier « {json_body.get('calendar_name') } »."
         case "calendar_shared_deleted_by_owner":
-            subject = "Partage annulé"
+            title = "Partage annulé"
             body = f"{json_body.get('sender_name')} a arrêté de partager le calendrier « {json_body.get('calendar_name') } » avec vous."
         case "calendar_shared_deleted_by_receiver":
-            subject = "Partage retiré"
+            title = "Partage retiré"
             body = f"{json_body.get('sender_name')} a retiré le calendrier « {json_body.get('calendar_name') } »."
         case "low_stock":
-            name = fetch_medicine_name(json_body.get("medication_id"))
+            # le nom est normalement résolu à l'enregistrement (fetch_notification_context)
+            name = json_body.get("medication_name") or fetch_medicine_name(json_body.get("medication_id"))
             qty = json_body.get("medication_qty") or 0
-            subject = "Stock faible"
+            title = "Stock faible"
             body = f"Le médicament « {name} » est presque épuisé ({qty} restants)."
+        case "low_stock_digest":
+            items = json_body.get("items") or []
+            names = ", ".join(f"{item.get('medication_name')} ({item.get('medication_qty') or 0})" for item in items)
+            title = "Stock faible"
+            body = f"{len(items)} médicaments sont presque épuisés : {names}."
         case _:
-            subject = "Nouvelle notification"
+            title = "Nouvelle notification"
             body = "Vous avez reçu une nouvelle notification dans MediTime."
+    return title, body
+
+def send_push_notification(uid, json_body, notif_type):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            # 1. Chercher le token FCM
+            cursor.execute("SELECT token FROM fcm_tokens WHERE uid = %s", (uid,))
+            tokens = [r["token"] for r in cursor.fetchall()]
+
+    title, body = render_notification(notif_type, json_body)
+
+    # 2. Envoyer la notif (si token trouvé)
+    if not tokens:
+        log_backend.warning(
+            f"Aucun token FCM trouvé pour l'utilisateur {uid}", 
+            {
+                "origin": "NOTIFICATIONS", 
+                "code": "NO_FCM_TOKEN", 
+                "uid": uid,
+            }
+        )
+        return {"success": True, "skipped": True}
+
+    errors = send_fcm_notification(tokens, title, body, json_body)
+    # les tokens désinscrits sont supprimés : inutile de réessayer pour eux
+    retryable = [error for error in errors if not error.get("unregistered")]
+    if retryable and len(errors) == len(tokens):
+        return {"success": False, "error": str(retryable)}
+    return {"success": True}
+
+def send_email_notification(uid, json_body, notif_type, user=None):
+    return send_email_notifications([(uid, json_body, notif_type, user)])[0]
+
+def send_email_notifications(notifications):
+    """
+    Envoie un lot d'emails sur une même session SMTP.
+    `notifications` : liste de (uid, json_body, notif_type, user) ; `user` est rechargé s'il vaut None.
+    Retourne un résultat par notification, dans l'ordre.
+    """
+    results = [None] * len(notifications)
+    emails, positions = [], []
+
+    for i, (uid, json_body, notif_type, user) in enumerate(notifications):
+        if user is None:
+            user = fetch_user(uid)
+        email = user.get("email") if user else None
+        if not email:
+            results[i] = {"success": True, "skipped": True}
+            continue
+        subject, plain_body, html_content = generate_email_content(notif_type, json_body)
+        emails.append({"to": email, "subject": subject, "html_content": html_content, "plain": plain_body})
+        positions.append(i)
+
+    for i, result in zip(positions, send_emails(emails)):
+        results[i] = result
+    return results
+
+def send_sms_notification(uid, json_body, notif_type, user=None):
+    return send_sms_notifications([(uid, json_body, notif_type, user)])[0]
+
+def send_sms_notifications(notifications):
+    """
+    Envoie un lot de SMS en parallèle (débit limité).
+    `notifications` : liste de (uid, json_body, notif_type, user) ; `user` est rechargé s'il vaut None.
+    Retourne un résultat par notification, dans l'ordre.
+    """
+    results = [None] * len(notifications)
+    messages, positions = [], []
+
+    for i, (uid, json_body, notif_type, user) in enumerate(notifications):
+        if user is None:
+            user = fetch_user(uid)
+        phone = user.get("phone") if user else None
+        if not phone:
+            results[i] = _no_phone_number(uid)
+            continue
+        subject, plain_body, html_content = generate_email_content(notif_type, json_body)
+        messages.append((phone, plain_body))
+        positions.append(i)
+
+    for i, result in zip(positions, send_sms_batch(messages)):
+        results[i] = result
+    return results
+
+def _no_phone_number(uid):
+    log_backend.warning(
+        f"Aucun numéro de téléphone trouvé pour l'utilisateur {uid}", 
+        {
+            "origin": "NOTIFICATIONS", 
+            "code": "NO_PHONE_NUMBER", 
+            "uid": uid,
+        }
+    )
+    return {"success": True, "skipped": True}
+
+def deliver_notification(uid, channel, notif_type, json_body, user=None):
+    """Envoie une notification de l'outbox sur un canal. Retourne {"success": bool, "error": ...}."""
+    match channel:
+        case "push":
+            return send_push_notification(uid, json_body, notif_type)
+        case "email":
+            return send_email_notification(uid, json_body, notif_type, user)
+        case "sms":
+            return send_sms_notification(uid, json_body, notif_type, user)
+    return {"success": False, "error": f"canal inconnu : {channel}"}
+
+def generate_email_content(notif_type, json_body):
+    base_link = f"https://{Config.FRONTEND_URL}/notifications"
+
+    subject, body = render_notification(notif_type, json_body)
 
     html_content = f"""
         <p style="font-size: 16px; color: #555;">{body}</p>
@@ -141,37 +209,26 @@ def generate_email_content(notif_type, json_body):
 
 def notify_and_record(uid, json_body, notif_type):
     try:
-        user_settings = fetch_user(uid)
-        email_enabled = user_settings.get("email_enabled")
-        push_enabled = user_settings.get("push_enabled")
-        sms_enabled = user_settings.get("sms_enabled")
-        
-        calendar_id = json_body.get("calendar_id")
         sender_uid = json_body.get("sender_uid")
-        
-        if calendar_id:
-            calendar_name = fetch_calendar_name(calendar_id)
-        else:
-            calendar_name = None
-        json_body["calendar_name"] = calendar_name
-
-    
-        sender_name = fetch_user_name(sender_uid)
-        json_body["sender_name"] = sender_name
-
-        if push_enabled:
-            send_push_notification(uid, json_body, notif_type)
-        if email_enabled:
-            send_email_notification(uid, json_body, notif_type)
-        if sms_enabled:
-            send_sms_notification(uid, json_body, notif_type)
-        
+
+        # l'envoi est fait par les workers de l'outbox, après le commit
         with get_connection() as conn:
             with conn.cursor() as cursor:
+                # destinataire + noms (expéditeur, calendrier, médicament) en une seule requête
+                user_settings = fetch_notification_context(cursor, uid, json_body)
+                channels = []
+                if user_settings.get("push_enabled"):
+                    channels.append("push")
+                if user_settings.get("email_enabled"):
+                    channels.append("email")
+                if user_settings.get("sms_enabled"):
+                    channels.append("sms")
+
                 cursor.execute("""
                     INSERT INTO notifications (user_id, type, read, timestamp, sender_uid, content)
                     VALUES (%s, %s, %s, NOW(), %s, %s::jsonb)
                 """, (uid, notif_type, False, sender_uid, json.dumps(json_body)))
+                enqueue_notification(cursor, uid, notif_type, json_body, channels)
                 conn.commit()
 
     except Exception as e:
@@ -183,4 +240,128 @@ def notify_and_record(uid, json_body, notif_type):
                 "error": str(e),
                 "trace": traceback.format_exc()
             }
-        )
\ No newline at end of file
+        )
+
+def notify_low_stock(cursor, boxes):
+    """
+    Notifications de stock faible pour tout un lot de boîtes.
+
+    Une ligne `notifications` par boîte (insertion groupée), mais un seul envoi par propriétaire
+    et par canal : la notification de la boîte s'il n'y en a qu'une, sinon un récapitulatif.
+    `boxes` : lignes avec id, name, stock_quantity, calendar_id, calendar_name, owner_uid, owner (réglages).
+    """
+    if not boxes:
+        return 0
+
+    sender_uid = Config.SYSTEM_UID
+    sender_name = "un utilisateur"
+    if sender_uid:
+        cursor.execute("SELECT display_name FROM users WHERE id = %s", (sender_uid,))
+        sender = cursor.fetchone()
+        sender_name = (sender or {}).get("display_name") or sender_name
+
+    records, entries = [], []
+    boxes = sorted(boxes, key=lambda box: str(box.get("owner_uid")))
+    for owner_uid, owner_boxes in groupby(boxes, key=lambda box: box.get("owner_uid")):
+        owner_boxes = list(owner_boxes)
+        owner = owner_boxes[0].get("owner") or {}
+
+        items = []
+        for box in owner_boxes:
+            json_body = {
+                "link": urljoin(Config.FRONTEND_URL or "", f"/medication/{box.get('id')}"),
+                "medication_id": box.get("id"),
+                "medication_qty": box.get("stock_quantity"),
+                "medication_name": box.get("name") or "unknown",
+                "calendar_id": box.get("calendar_id"),
+                "calendar_name": box.get("calendar_name") or "unknown",
+                "sender_uid": sender_uid,
+                "sender_name": sender_name,
+            }
+            items.append(json_body)
+            records.append((owner_uid, "low_stock", sender_uid, json.dumps(json_body, default=str)))
+
+        if len(items) == 1:
+            notif_type, payload = "low_stock", items[0]
+        else:
+            notif_type = "low_stock_digest"
+            payload = {
+                "link": urljoin(Config.FRONTEND_URL or "", "/notifications"),
+                "sender_uid": sender_uid,
+                "sender_name": sender_name,
+                "items": items,
+            }
+
+        for channel, setting in (("push", "push_enabled"), ("email", "email_enabled"), ("sms", "sms_enabled")):
+            if owner.get(setting):
+                entries.append((owner_uid, channel, notif_type, payload))
+
+    execute_values(
+        cursor,
+        "INSERT INTO notifications (user_id, type, read, timestamp, sender_uid, content) VALUES %s",
+        records,
+        template="(%s, %s, false, NOW(), %s, %s::jsonb)"
+    )
+    enqueue_notifications(cursor, entries)
+    return len(entries)
+
+
+# Fil des notifications : pagination par curseur (timestamp, id), du plus récent au plus ancien.
+# Les notifications sans calendrier ne sont pas affichées dans le fil.
+FEED_FILTER_SQL = "user_id = %(uid)s AND NULLIF(content->>'calendar_id', '') IS NOT NULL"
+
+def encode_notifications_cursor(notif):
+    """Curseur opaque pointant après `notif` (dernière ligne de la page)."""
+    timestamp = notif.get("timestamp")
+    position = [timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp, str(notif.get("id"))]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_notifications_cursor(cursor_value):
+    """(timestamp, id) du curseur. Lève ValueError si le curseur est invalide."""
+    try:
+        timestamp, notification_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode()))
+    except Exception:
+        raise ValueError("curseur invalide")
+    if not timestamp or not notification_id:
+        raise ValueError("curseur invalide")
+    return timestamp, notification_id
+
+def fetch_notifications_page(uid, limit, cursor_value=None, unread_only=False):
+    """
+    Une page du fil : (notifications, curseur de la page suivante ou None).
+    Lève ValueError si le curseur est invalide.
+    """
+    conditions = [FEED_FILTER_SQL]
+    params = {"uid": uid, "limit": limit + 1}
+    if unread_only:
+        conditions.append("read = false")
+    if cursor_value:
+        params["cursor_ts"], params["cursor_id"] = decode_notifications_cursor(cursor_value)
+        conditions.append("(timestamp, id) < (%(cursor_ts)s, %(cursor_id)s)")
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            # une ligne de plus que demandé pour savoir s'il reste une page
+            cursor.execute(f"""
+                SELECT id, type, read, timestamp, sender_uid, content
+                FROM notifications
+                WHERE {" AND ".join(conditions)}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT %(limit)s
+            """, params)
+            rows = cursor.fetchall()
+
+    next_cursor = encode_notifications_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def count_unread_notifications(uid):
+    """Nombre de notifications non lues du fil."""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS unread_count
+                FROM notifications
+                WHERE {FEED_FILTER_SQL} AND read = false
+            """, {"uid": uid})
+            result = cursor.fetchone()
+    return (result or {}).get("unread_count") or 0
@@ -0,0 +1,117 @@
+import json
+import threading
+from psycopg2.extras import execute_values
+from app.config import Config
+from app.db.connection import on_commit
+
+CHANNELS = ("push", "email", "sms")
+
+# réveille les workers du process dès qu'une notification est validée en base
+_outbox_event = threading.Event()
+
+CLAIM_OUTBOX_SQL = """
+    UPDATE notification_outbox o
+    SET status = 'processing',
+        attempts = o.attempts + 1,
+        locked_until = NOW() + make_interval(secs => %(lease)s)
+    WHERE o.id IN (
+        SELECT id FROM notification_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= NOW())
+           OR (status = 'processing' AND locked_until < NOW() AND attempts < %(max_attempts)s)
+        ORDER BY next_attempt_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.id, o.user_id, o.channel, o.type, o.payload, o.attempts
+"""
+
+
+# lignes dont le bail a expiré sans résultat après OUTBOX_MAX_ATTEMPTS tentatives
+# (worker tué pendant l'envoi, lot en erreur avant l'enregistrement) : abandonnées
+FAIL_EXHAUSTED_OUTBOX_SQL = """
+    UPDATE notification_outbox
+    SET status = 'failed',
+        locked_until = NULL,
+        last_error = COALESCE(last_error, 'bail expiré sans résultat')
+    WHERE status = 'processing' AND locked_until < NOW() AND attempts >= %(max_attempts)s
+"""
+
+
+def wake_outbox_workers():
+    _outbox_event.set()
+
+
+def wait_for_outbox(timeout):
+    """Attend une nouvelle notification (ou `timeout` secondes)."""
+    woken = _outbox_event.wait(timeout)
+    _outbox_event.clear()
+    return woken
+
+
+def enqueue_notification(cursor, uid, notif_type, json_body, channels):
+    """Ajoute une ligne `pending` par canal dans l'outbox (même transaction que l'appelant)."""
+    enqueue_notifications(cursor, [(uid, channel, notif_type, json_body) for channel in channels])
+
+
+def enqueue_notifications(cursor, entries):
+    """Version groupée : `entries` = [(uid, canal, type, json_body)], insérées en une requête."""
+    rows = [
+        (uid, channel, notif_type, json.dumps(json_body, default=str))
+        for uid, channel, notif_type, json_body in entries
+        if channel in CHANNELS
+    ]
+    if not rows:
+        return
+
+    execute_values(
+        cursor,
+        "INSERT INTO notification_outbox (user_id, channel, type, payload) VALUES %s",
+        rows,
+        template="(%s, %s, %s, %s::jsonb)"
+    )
+    on_commit(wake_outbox_workers)
+
+
+def claim_outbox(cursor, limit):
+    """
+    Réserve jusqu'à `limit` notifications à envoyer ; les lignes déjà prises par un autre worker sont sautées.
+    Les lignes bloquées en `processing` qui ont épuisé leurs tentatives passent d'abord en `failed`.
+    """
+    cursor.execute(FAIL_EXHAUSTED_OUTBOX_SQL, {"max_attempts": Config.OUTBOX_MAX_ATTEMPTS})
+    cursor.execute(CLAIM_OUTBOX_SQL, {
+        "lease": Config.OUTBOX_LEASE_SECONDS,
+        "limit": limit,
+        "max_attempts": Config.OUTBOX_MAX_ATTEMPTS,
+    })
+    return cursor.fetchall()
+
+
+def mark_outbox_sent(cursor, outbox_id):
+    cursor.execute("""
+        UPDATE notification_outbox
+        SET status = 'sent', sent_at = NOW(), locked_until = NULL, last_error = NULL
+        WHERE id = %s
+    """, (outbox_id,))
+
+
+def outbox_retry_delay(attempts):
+    """Backoff exponentiel : base, 2 x base, 4 x base... plafonné."""
+    return min(Config.OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1)), Config.OUTBOX_BACKOFF_MAX)
+
+
+def mark_outbox_failed(cursor, outbox_id, attempts, error):
+    """Replanifie l'envoi avec backoff, ou l'abandonne après `OUTBOX_MAX_ATTEMPTS` tentatives."""
+    cursor.execute("""
+        UPDATE notification_outbox
+        SET status = CASE WHEN %(attempts)s >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+            next_attempt_at = NOW() + make_interval(secs => %(delay)s),
+            locked_until = NULL,
+            last_error = %(error)s
+        WHERE id = %(id)s
+    """, {
+        "id": outbox_id,
+        "attempts": attempts,
+        "max_attempts": Config.OUTBOX_MAX_ATTEMPTS,
+        "delay": outbox_retry_delay(attempts),
+        "error": str(error)[:1000],
+    })
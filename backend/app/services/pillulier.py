@@ -1,5 +1,5 @@
 from app.db.connection import get_connection
-from app.services.process_box_decrement import process_box_decrement
+from app.services.process_box_decrement import process_boxes_decrement
 
 def use_pillulier(calendar_id, start_date):
     """
@@ -20,20 +20,7 @@ def use_pillulier(calendar_id, start_date):
                 if mode != "manual":
                     return True
 
-                cursor.execute("""
-                    SELECT id, stock_quantity FROM medicine_boxes
-                    WHERE calendar_id = %s AND box_capacity > 0
-                """, (calendar_id,))
-                results = cursor.fetchall()
-
-                if not results:
-                    return True
-
-                for result in results:
-                    id_box = result.get("id")
-                    qty = result.get("stock_quantity")
-
-                    process_box_decrement(cursor, id_box, qty, start_date)
+                process_boxes_decrement(cursor, start_date, calendar_id)
 
                 conn.commit()
 
@@ -1,38 +1,72 @@
-from datetime import timedelta
-import re
-from this import d
+DAYS_PER_WEEK = 7
 
-from psycopg2.sql import NULL
-from app.services.calendar_service import is_medication_due
+# Consommation de la semaine calculée côté SQL pour toutes les boîtes d'un coup.
+# Pour chaque condition, le nombre de prises sur la période est calculé directement
+# (même règle que recurrence.first_due_date / iter_due_dates) : décalage du premier jour dû,
+# puis division par l'intervalle. Une seule UPDATE applique ensuite la baisse
+# et incrémente la version des calendriers concernés.
+BULK_DECREMENT_SQL = """
+    WITH consumption AS (
+        SELECT cond.box_id, SUM(cond.tablet_count * due.count) AS tablets
+        FROM medicine_box_conditions cond
+        JOIN medicine_boxes box ON box.id = cond.box_id
+        JOIN calendars c ON c.id = box.calendar_id
+        CROSS JOIN LATERAL (
+            SELECT CASE
+                WHEN cond.start_date IS NULL THEN %(days)s
+                WHEN first_due.offs > %(days)s - 1 THEN 0
+                ELSE (%(days)s - 1 - first_due.offs) / cond.interval_days + 1
+            END AS count
+            FROM (
+                SELECT CASE
+                    WHEN cond.start_date::date >= %(start_date)s::date
+                        THEN cond.start_date::date - %(start_date)s::date
+                    ELSE (cond.interval_days - (%(start_date)s::date - cond.start_date::date) %% cond.interval_days) %% cond.interval_days
+                END AS offs
+            ) AS first_due
+        ) AS due
+        WHERE {scope}
+            AND cond.tablet_count IS NOT NULL
+            AND cond.interval_days > 0
+        GROUP BY cond.box_id
+    ),
+    updated AS (
+        UPDATE medicine_boxes box
+        SET stock_quantity = GREATEST(0, box.stock_quantity - consumption.tablets)
+        FROM consumption
+        WHERE box.id = consumption.box_id AND consumption.tablets > 0
+        RETURNING box.id, box.calendar_id, box.stock_quantity
+    ),
+    bumped AS (
+        -- le stock fait partie des réponses /boxes : on change la version des calendriers touchés
+        UPDATE calendars SET version = version + 1
+        WHERE id IN (SELECT DISTINCT calendar_id FROM updated)
+    )
+    SELECT * FROM updated
+"""
 
-def process_box_decrement(cursor, id_box, qty, start_date):
-    """
-    Calcule et applique la diminution du stock pour une boîte donnée sur une semaine.
-    """
-    cursor.execute("""
-        SELECT tablet_count, start_date, interval_days
-        FROM medicine_box_conditions
-        WHERE box_id = %s
-    """, (id_box,))
-    conditions = cursor.fetchall()
+# Boîtes des calendriers en décompte automatique (cron hebdomadaire)
+AUTO_SCOPE = "c.stock_decrement_mode = 'auto' AND box.stock_quantity > 0"
+# Boîtes d'un calendrier précis (pilulier utilisé manuellement)
+CALENDAR_SCOPE = "box.calendar_id = %(calendar_id)s AND box.box_capacity > 0"
 
-    total_tablets_week = 0
-    if not start_date:
-        return
-        
-    for i in range(7):
-        day = start_date + timedelta(days=i)
 
-        total_tablets_day = sum(
-            condition.get("tablet_count") for condition in conditions
-            if is_medication_due(condition, day) and condition.get("tablet_count") is not None
-        )
+def process_boxes_decrement(cursor, start_date, calendar_id=None):
+    """
+    Calcule et applique la diminution du stock sur une semaine à partir de `start_date`,
+    en une seule requête quel que soit le nombre de boîtes.
 
-        total_tablets_week += total_tablets_day
+    Sans `calendar_id` : toutes les boîtes en stock des calendriers en mode `auto`.
+    Avec `calendar_id` : les boîtes de ce calendrier ayant une capacité.
+    Retourne les boîtes modifiées (id, calendar_id, stock_quantity).
+    """
+    if not start_date:
+        return []
 
-    if total_tablets_week > 0:
-        new_qty = max(0, qty - total_tablets_week)
-        cursor.execute(
-            "UPDATE medicine_boxes SET stock_quantity = %s WHERE id = %s",
-            (new_qty, id_box)
-        )
+    scope = AUTO_SCOPE if calendar_id is None else CALENDAR_SCOPE
+    cursor.execute(BULK_DECREMENT_SQL.format(scope=scope), {
+        "start_date": start_date,
+        "days": DAYS_PER_WEEK,
+        "calendar_id": calendar_id,
+    })
+    return cursor.fetchall()
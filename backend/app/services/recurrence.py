@@ -0,0 +1,52 @@
+from datetime import date, datetime, timedelta
+
+
+def _anchor(med):
+    """Date de départ de la condition, ou None si elle n'en a pas (prise tous les jours)."""
+    start_date = med.get("start_date")
+    if isinstance(start_date, datetime):
+        return start_date.date()
+    if isinstance(start_date, date):
+        return start_date
+    return None
+
+
+def _interval(med):
+    try:
+        interval = int(med.get("interval_days"))
+    except (TypeError, ValueError):
+        return None
+    return interval if interval > 0 else None
+
+
+def first_due_date(med, start_date, end_date):
+    """
+    Première date de [start_date, end_date] où la condition est due, ou None.
+    Même règle que is_medication_due : jours `start_date + k * interval_days` (k >= 0),
+    tous les jours si la condition n'a pas de date de départ.
+    """
+    interval = _interval(med)
+    if interval is None or start_date > end_date:
+        return None
+
+    anchor = _anchor(med)
+    if anchor is None or anchor >= start_date:
+        first = anchor or start_date
+    else:
+        # on saute directement au premier multiple de l'intervalle après start_date
+        steps = -(-(start_date - anchor).days // interval)
+        first = anchor + timedelta(days=steps * interval)
+
+    return first if first <= end_date else None
+
+
+def iter_due_dates(med, start_date, end_date):
+    """Génère les dates (bornes incluses) où la condition est due, sans tester chaque jour."""
+    current = first_due_date(med, start_date, end_date)
+    if current is None:
+        return
+
+    step = timedelta(days=_interval(med) if _anchor(med) else 1)
+    while current <= end_date:
+        yield current
+        current += step
@@ -0,0 +1,132 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import execute_values
+from app.config import Config
+from app.db.connection import get_connection, on_commit
+from app.services.calendar_service import load_schedule_weeks, assemble_schedule
+from app.utils.logger import log_backend as logger
+
+# Plannings publics (liens de partage) pré-générés : semaine courante + SCHEDULE_SNAPSHOT_WEEKS suivantes.
+# Une ligne n'est servie que si sa version est celle du calendrier ; les modifications de boîtes
+# suppriment les lignes dans leur transaction puis les régénèrent en arrière-plan après le commit.
+
+_executor = ThreadPoolExecutor(max_workers=max(1, Config.SCHEDULE_SNAPSHOT_WORKERS), thread_name_prefix="snapshot")
+_pending = set()
+_pending_lock = threading.Lock()
+
+READ_SNAPSHOTS_SQL = """
+    SELECT s.week_start, s.version, s.payload, c.name AS calendar_name
+    FROM schedule_snapshots s
+    JOIN calendars c ON c.id = s.calendar_id AND c.version = s.version
+    JOIN shared_tokens t ON t.calendar_id = c.id AND t.owner_uid = c.owner_uid AND t.id = %s AND NOT t.revoked
+    WHERE s.calendar_id = %s AND s.week_start = ANY(%s)
+"""
+
+
+def snapshot_week_starts(today=None):
+    """Lundis matérialisés : semaine courante + SCHEDULE_SNAPSHOT_WEEKS suivantes."""
+    today = today or datetime.now(timezone.utc).date()
+    monday = today - timedelta(days=today.weekday())
+    return [monday + timedelta(weeks=week) for week in range(Config.SCHEDULE_SNAPSHOT_WEEKS + 1)]
+
+
+def snapshot_covers(start_date, weeks):
+    """La période demandée fait-elle partie des semaines matérialisées ?"""
+    week_starts = snapshot_week_starts()
+    return week_starts[0] <= start_date and start_date + timedelta(weeks=weeks - 1) <= week_starts[-1]
+
+
+def fetch_schedule_snapshot(calendar_id, token, start_date, weeks):
+    """
+    Planning servi depuis les snapshots : (événements, tableaux, nom du calendrier, version),
+    ou None si une des semaines demandées n'est pas (ou plus) matérialisée ou si `token` n'est plus actif.
+    """
+    week_starts = [start_date + timedelta(weeks=week) for week in range(weeks)]
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(READ_SNAPSHOTS_SQL, (token, calendar_id, week_starts))
+            rows = cursor.fetchall()
+
+    weeks_data = {row["week_start"]: row["payload"] for row in rows}
+    versions = {row["version"] for row in rows}
+    if len(versions) != 1 or any(week_start not in weeks_data for week_start in week_starts):
+        return None
+
+    schedule, tables, calendar_name = assemble_schedule(weeks_data, week_starts, rows[0]["calendar_name"])
+    return schedule, tables, calendar_name, versions.pop()
+
+
+def refresh_schedule_snapshots(calendar_id):
+    """Régénère les snapshots d'un calendrier partagé par un token actif (sinon les supprime)."""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.id, c.name, c.version
+                FROM calendars c
+                WHERE c.id = %s
+                  AND EXISTS (SELECT 1 FROM shared_tokens t WHERE t.calendar_id = c.id AND NOT t.revoked)
+            """, (calendar_id,))
+            calendar = cursor.fetchone()
+
+            if calendar is None:
+                cursor.execute("DELETE FROM schedule_snapshots WHERE calendar_id = %s", (calendar_id,))
+                conn.commit()
+                return 0
+
+            week_starts = snapshot_week_starts()
+            weeks_data = load_schedule_weeks(cursor, calendar, week_starts)
+
+            # les semaines passées ne sont plus servies
+            cursor.execute(
+                "DELETE FROM schedule_snapshots WHERE calendar_id = %s AND week_start < %s",
+                (calendar_id, week_starts[0])
+            )
+            # une version plus récente déjà écrite (régénération concurrente) n'est pas écrasée
+            execute_values(cursor, """
+                INSERT INTO schedule_snapshots (calendar_id, week_start, version, payload)
+                VALUES %s
+                ON CONFLICT (calendar_id, week_start) DO UPDATE
+                SET version = EXCLUDED.version, payload = EXCLUDED.payload, generated_at = NOW()
+                WHERE schedule_snapshots.version <= EXCLUDED.version
+            """, [
+                (calendar.get("id"), week_start, calendar.get("version", 0), json.dumps(weeks_data[week_start], default=str))
+                for week_start in week_starts
+            ], template="(%s, %s, %s, %s::jsonb)")
+            conn.commit()
+
+    return len(week_starts)
+
+
+def _refresh_in_background(calendar_id):
+    # retiré dès le début : une modification pendant la génération replanifie un passage
+    with _pending_lock:
+        _pending.discard(str(calendar_id))
+    try:
+        refresh_schedule_snapshots(calendar_id)
+    except Exception as e:
+        logger.error("erreur lors de la génération des snapshots de planning", {
+            "origin": "SCHEDULE_SNAPSHOT",
+            "calendar_id": calendar_id,
+            "error": str(e)
+        })
+
+
+def schedule_snapshot_refresh(calendar_id):
+    """Planifie la régénération en arrière-plan (une seule en attente par calendrier)."""
+    with _pending_lock:
+        if str(calendar_id) in _pending:
+            return
+        _pending.add(str(calendar_id))
+    _executor.submit(_refresh_in_background, calendar_id)
+
+
+def invalidate_schedule_snapshots(cursor, calendar_id, refresh=True):
+    """
+    Supprime les snapshots du calendrier dans la transaction de l'appelant ;
+    ils sont régénérés après le commit (sauf `refresh=False`, ex. suppression du calendrier).
+    """
+    cursor.execute("DELETE FROM schedule_snapshots WHERE calendar_id = %s", (calendar_id,))
+    if refresh:
+        on_commit(lambda: schedule_snapshot_refresh(calendar_id))
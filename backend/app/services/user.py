@@ -8,6 +8,16 @@ def fetch_user(uid):
             user = cursor.fetchone() or {}
             return user
 
+def fetch_users(uids):
+    """Charge plusieurs utilisateurs en une requête. Retourne {uid: user}."""
+    uids = tuple(set(uids))
+    if not uids:
+        return {}
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM users WHERE id IN %s", (uids,))
+            return {str(user.get("id")): user for user in cursor.fetchall()}
+
 def update_existing_user(uid, user_db, display_name, email, photo_url, email_enabled, push_enabled):
     with get_connection() as conn:
         with conn.cursor() as cursor:
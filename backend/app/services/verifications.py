@@ -1,27 +1,58 @@
-from app.db.connection import get_connection
+from app.config import Config
+from app.db.connection import get_connection, on_commit
+from app.utils.cache import create_cache
 from app.utils.logger import log_backend as logger
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
-def verify_calendar_share(calendar_id : str, receiver_uid : str) -> bool:
-    try:
+_access_cache = create_cache("calendar-access", max_entries=Config.AUTH_CACHE_MAX_ENTRIES, ttl=Config.AUTH_CACHE_TTL)
+
+ACCESS_ROLES = ("owner", "shared")
+
+
+def _access_key(uid, calendar_id, role):
+    return f"{role}:{uid}:{calendar_id}"
+
+
+def invalidate_calendar_access(calendar_id, *uids):
+    """
+    Oublie les droits en cache de ces utilisateurs sur le calendrier.
+    Appliqué après le commit, pour qu'une requête concurrente ne remette pas l'ancien état en cache.
+    """
+    def invalidate():
+        for uid in uids:
+            for role in ACCESS_ROLES:
+                _access_cache.delete(_access_key(uid, calendar_id, role))
+    on_commit(invalidate)
+
+
+def _cached_access(uid, calendar_id, role, query, params):
+    key = _access_key(uid, calendar_id, role)
+    allowed = _access_cache.get(key)
+    if allowed is None:
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM calendars WHERE id = %s", (calendar_id,))
-                calendar = cursor.fetchone()
-                if not calendar:
-                    return False
-                
-                cursor.execute("SELECT * FROM shared_calendars WHERE calendar_id = %s AND receiver_uid = %s", (calendar_id, receiver_uid,))
-                shared_calendar = cursor.fetchone()
-                if not shared_calendar:
-                    logger.warning("accès refusé", {
-                        "origin": "SHARED_VERIFY",
-                        "uid": receiver_uid,
-                        "calendar_id": calendar_id,
-                    })
-                    return False
-                
-                return True
+                cursor.execute(query, params)
+                allowed = bool(cursor.fetchone().get("allowed"))
+        _access_cache.set(key, allowed)
+    return allowed
+
+
+def verify_calendar_share(calendar_id : str, receiver_uid : str) -> bool:
+    try:
+        allowed = _cached_access(receiver_uid, calendar_id, "shared", """
+            SELECT EXISTS (
+                SELECT 1 FROM shared_calendars sc
+                JOIN calendars c ON c.id = sc.calendar_id
+                WHERE sc.calendar_id = %s AND sc.receiver_uid = %s
+            ) AS allowed
+        """, (calendar_id, receiver_uid))
+        if not allowed:
+            logger.warning("accès refusé", {
+                "origin": "SHARED_VERIFY",
+                "uid": receiver_uid,
+                "calendar_id": calendar_id,
+            })
+        return allowed
 
     except Exception as e:
         logger.error("erreur lors de la vérification de l'accès au calendrier partagé", {
@@ -34,14 +65,9 @@ def verify_calendar_share(calendar_id : str, receiver_uid : str) -> bool:
 
 def verify_calendar(calendar_id : str, uid : str) -> bool:
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM calendars WHERE id = %s AND owner_uid = %s", (calendar_id, uid,))
-                calendar = cursor.fetchone()
-                if not calendar:
-                    return False
-                
-                return True
+        return _cached_access(uid, calendar_id, "owner", """
+            SELECT EXISTS (SELECT 1 FROM calendars WHERE id = %s AND owner_uid = %s) AS allowed
+        """, (calendar_id, uid))
 
     except Exception as e:
         logger.error("erreur lors de la vérification de l'accès au calendrier", {
@@ -52,36 +78,77 @@ def verify_calendar(calendar_id : str, uid : str) -> bool:
         })
         return False
 
+_token_cache = create_cache("share-tokens", max_entries=Config.TOKEN_CACHE_MAX_ENTRIES, ttl=Config.TOKEN_CACHE_TTL)
+
+
+def invalidate_token(token):
+    """Oublie la résolution en cache d'un token de partage (après le commit)."""
+    on_commit(lambda: _token_cache.delete(str(token)))
+
+
+def resolve_token(token):
+    """
+    Résout un token de partage en une requête (token + contrôle du propriétaire du calendrier), avec cache.
+    Retourne {calendar_id, owner_uid, owner_ok, expires_on, revoked, permissions} ou None si le token n'existe pas.
+    """
+    resolution = _token_cache.get(str(token))
+    if resolution is not None:
+        return resolution or None
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT t.calendar_id, t.owner_uid, t.expires_at, t.revoked, t.permissions,
+                       (c.id IS NOT NULL) AS owner_ok
+                FROM shared_tokens t
+                LEFT JOIN calendars c ON c.id = t.calendar_id AND c.owner_uid = t.owner_uid
+                WHERE t.id = %s
+            """, (token,))
+            token_data = cursor.fetchone()
+
+    if not token_data:
+        # token inconnu gardé en cache aussi ({} = absent)
+        _token_cache.set(str(token), {})
+        return None
+
+    expires_at = token_data.get("expires_at")
+    if isinstance(expires_at, datetime):
+        expires_at = expires_at.date()
+
+    resolution = {
+        "calendar_id": str(token_data.get("calendar_id")),
+        "owner_uid": str(token_data.get("owner_uid")),
+        "owner_ok": bool(token_data.get("owner_ok")),
+        "expires_on": expires_at.isoformat() if expires_at else None,
+        "revoked": bool(token_data.get("revoked")),
+        "permissions": list(token_data.get("permissions") or []),
+    }
+    _token_cache.set(str(token), resolution)
+    return resolution
+
+
 def verify_token(token : str) -> bool:
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM shared_tokens WHERE id = %s", (token,))
-                token_data = cursor.fetchone()
-                if not token_data:
-                    return False
+        resolution = resolve_token(token)
+        if not resolution:
+            return False
 
-                calendar_id = token_data.get("calendar_id")
-                owner_uid = token_data.get("owner_uid")
-                expires_at = token_data.get("expires_at")
-                revoked = token_data.get("revoked")
-                permissions = token_data.get("permissions")
+        if not resolution.get("owner_ok"):
+            return False
 
-                if not verify_calendar(calendar_id, owner_uid):
-                    return False
+        now = datetime.now(timezone.utc).date()
 
-                now = datetime.now(timezone.utc).date()
-                
-                if expires_at and now > expires_at.date():
-                    return False
+        expires_on = resolution.get("expires_on")
+        if expires_on and now > date.fromisoformat(expires_on):
+            return False
 
-                if revoked:
-                    return False
+        if resolution.get("revoked"):
+            return False
 
-                if "read" not in permissions:
-                    return False
+        if "read" not in resolution.get("permissions"):
+            return False
 
-                return calendar_id
+        return resolution.get("calendar_id")
 
     except Exception as e:
         logger.error("erreur lors de la vérification du token", {
@@ -93,17 +160,14 @@ def verify_token(token : str) -> bool:
 
 def verify_token_owner(token : str, uid : str) -> bool:
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM shared_tokens WHERE id = %s", (token,))
-                token_data = cursor.fetchone()
-                if not token_data:
-                    return False
+        resolution = resolve_token(token)
+        if not resolution:
+            return False
 
-                if token_data.get("owner_uid") != uid:
-                    return False
+        if resolution.get("owner_uid") != str(uid):
+            return False
 
-                return True
+        return True
 
     except Exception as e:
         logger.error("erreur lors de la vérification de la propriété du token", {
@@ -112,4 +176,4 @@ def verify_token_owner(token : str, uid : str) -> bool:
             "uid": uid,
             "error": str(e)
         })
-        return False
\ No newline at end of file
+        return False
@@ -2,3 +2,4 @@ from .validators import *
 from .logger import *
 from .response import *
 from .logo_upload import *
+from .cache import *
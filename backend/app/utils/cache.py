@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from app.config.config import Config
+
+
+class MemoryCache:
+    """
+    Cache LRU + TTL en mémoire du process, thread-safe.
+    Les valeurs sont gardées telles quelles : ne pas les modifier après lecture.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """
+    Cache partagé entre tous les workers (Redis). Valeurs sérialisées en JSON.
+    Nécessite le paquet `redis` et `CACHE_REDIS_URL`.
+    """
+
+    def __init__(self, namespace, url, ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis nécessite le paquet 'redis'")
+
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"medic:{self.namespace}:{key}"
+
+    def get(self, key):
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._client.set(self._key(key), json.dumps(value, default=str), ex=int(max(1, ttl)))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(self._key("*")):
+            self._client.delete(key)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def create_cache(namespace, max_entries=1024, ttl=300, shared=True):
+    """
+    Crée un cache selon `Config.CACHE_BACKEND` (`memory` par défaut, ou `redis`).
+    `shared=False` force le cache mémoire (données propres au process).
+    """
+    if shared and Config.CACHE_BACKEND == "redis":
+        return RedisCache(namespace, Config.CACHE_REDIS_URL, ttl=ttl)
+    return MemoryCache(max_entries=max_entries, ttl=ttl)
@@ -1,9 +1,30 @@
-from flask import jsonify
+import hashlib
+from flask import jsonify, request, Response
 from app.utils.logger import log_backend as logger
 
+# le client garde la réponse mais doit toujours la revalider avec If-None-Match
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
 #exemple de log_extra : {'calendar_id': '98fb17305b9a8005b603b51f4820f30d', 'uid': '98fb17305b9a8005b603b51f4820f30d'}
 
-def success_response(message, code, uid=None, origin=None, data=None, log_extra=None):
+def make_etag(*parts):
+    """ETag fort calculé à partir de ce qui détermine la représentation (id, version, paramètres...)."""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def etag_matches(etag):
+    """True si le client a déjà cette représentation (en-tête If-None-Match)."""
+    return etag is not None and request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag, cache_control=DEFAULT_CACHE_CONTROL):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def success_response(message, code, uid=None, origin=None, data=None, log_extra=None, etag=None, cache_control=DEFAULT_CACHE_CONTROL):
     log_extra = log_extra or {}
 
     payload = {"message": message, "code": code}
@@ -23,7 +44,11 @@ def success_response(message, code, uid=None, origin=None, data=None, log_extra=
             **log_extra
         })
 
-    return jsonify(payload), 200
+    response = jsonify(payload)
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+    return response, 200
 
 
 def error_response(message, code, status_code=500, uid=None, origin=None, error=None, log_extra=None):
@@ -1,15 +1,22 @@
+import hashlib
+import time
 from functools import wraps
 from flask import request, jsonify, g
 import jwt
 from app.config.config import Config
+from app.utils.cache import create_cache
 from app.utils.logger import log_backend as logger
 
 
-def decode_token(token):
-    """Décode un token JWT Supabase et retourne l'utilisateur (payload) ou None."""
-    if not token:
-        return None
+# claims déjà vérifiées, par empreinte du token (propre au process : jamais partagé)
+_claims_cache = create_cache("jwt-claims", max_entries=Config.JWT_CACHE_MAX_ENTRIES, ttl=Config.JWT_CACHE_MAX_TTL, shared=False)
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
 
+
+def _verify_token(token):
     try:
         return jwt.decode(
             token,
@@ -30,6 +37,39 @@ def decode_token(token):
     return None
 
 
+def decode_token(token):
+    """
+    Décode un token JWT Supabase et retourne l'utilisateur (payload) ou None.
+    Les tokens déjà vérifiés sont gardés en cache jusqu'à leur `exp` ; les tokens refusés
+    quelques secondes, pour ne pas revérifier (ni relogguer) un client qui insiste.
+    """
+    if not token:
+        return None
+
+    key = _token_key(token)
+    cached = _claims_cache.get(key)
+    if cached is not None:
+        if cached is False or (cached.get("exp") and cached["exp"] <= time.time()):
+            return None
+        return cached
+
+    claims = _verify_token(token)
+    if claims is None:
+        _claims_cache.set(key, False, ttl=Config.JWT_NEGATIVE_CACHE_TTL)
+        return None
+
+    ttl = Config.JWT_CACHE_MAX_TTL
+    if claims.get("exp"):
+        ttl = min(ttl, claims["exp"] - time.time())
+    _claims_cache.set(key, claims, ttl=ttl)
+    return claims
+
+
+def jwt_cache_stats():
+    """Compteurs hits / misses du cache des tokens vérifiés."""
+    return _claims_cache.stats()
+
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -0,0 +1,3 @@
+-- Version d'un calendrier, incrémentée à chaque modification de ses boîtes / conditions / nom.
+-- Sert de clé aux caches de planning : une nouvelle version rend les anciennes entrées inutilisables.
+ALTER TABLE calendars ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,20 @@
+-- Outbox des notifications en attente d'envoi (push / email / sms).
+-- Une ligne par canal ; les workers d'arrière-plan réservent les lignes avec FOR UPDATE SKIP LOCKED.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    channel TEXT NOT NULL CHECK (channel IN ('push', 'email', 'sms')),
+    type TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'sent', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS notification_outbox_due_idx
+    ON notification_outbox (next_attempt_at)
+    WHERE status IN ('pending', 'processing');
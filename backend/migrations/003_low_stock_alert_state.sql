@@ -0,0 +1,15 @@
+-- État d'alerte de stock faible par boîte : une alerte part quand la boîte passe sous son seuil,
+-- puis seulement après le délai de relance (LOW_STOCK_REALERT_DAYS) ou un réapprovisionnement.
+-- L'état est remis à zéro quand la boîte repasse au-dessus de son seuil.
+ALTER TABLE medicine_boxes ADD COLUMN IF NOT EXISTS low_stock_alerted_at TIMESTAMPTZ;
+ALTER TABLE medicine_boxes ADD COLUMN IF NOT EXISTS low_stock_alerted_qty INT;
+
+-- Boîtes actuellement sous leur seuil (vérification des stocks faibles)
+CREATE INDEX IF NOT EXISTS medicine_boxes_low_stock_idx
+    ON medicine_boxes (low_stock_alerted_at)
+    WHERE stock_alert_threshold > 0 AND stock_quantity <= stock_alert_threshold;
+
+-- Boîtes avec une alerte en cours (remise à zéro après réapprovisionnement)
+CREATE INDEX IF NOT EXISTS medicine_boxes_low_stock_alerted_idx
+    ON medicine_boxes (id)
+    WHERE low_stock_alerted_at IS NOT NULL;
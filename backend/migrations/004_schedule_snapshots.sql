@@ -0,0 +1,22 @@
+-- Plannings hebdomadaires pré-générés des calendriers partagés par un lien public.
+-- Une ligne par (calendrier, semaine) ; elle n'est servie que si sa version est celle de
+-- calendars.version, et elle est supprimée dans la transaction de toute modification des boîtes.
+-- `calendar_id` reprend le type de calendars.id pour que la jointure utilise la clé primaire.
+DO $$
+DECLARE
+    id_type TEXT;
+BEGIN
+    SELECT format_type(a.atttypid, a.atttypmod) INTO id_type
+    FROM pg_attribute a
+    WHERE a.attrelid = 'calendars'::regclass AND a.attname = 'id';
+
+    EXECUTE format('
+        CREATE TABLE IF NOT EXISTS schedule_snapshots (
+            calendar_id %s NOT NULL REFERENCES calendars(id) ON DELETE CASCADE,
+            week_start DATE NOT NULL,
+            version BIGINT NOT NULL,
+            payload JSONB NOT NULL,
+            generated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (calendar_id, week_start)
+        )', id_type);
+END $$;
@@ -0,0 +1,8 @@
+-- Fil des notifications : pagination par curseur sur (timestamp, id), du plus récent au plus ancien.
+CREATE INDEX IF NOT EXISTS notifications_user_feed_idx
+    ON notifications (user_id, "timestamp" DESC, id DESC);
+
+-- Fil des non lues et compteur de notifications non lues
+CREATE INDEX IF NOT EXISTS notifications_user_unread_idx
+    ON notifications (user_id, "timestamp" DESC, id DESC)
+    WHERE read = false;
@@ -11,6 +11,7 @@ import { formatToLocalISODate } from './utils/dateUtils';
 import RealtimeManager from './components/RealtimeManager';
 import { getToken } from './services/tokenUtils';
 import { performApiCall } from './services/apiUtils';
+import { NOTIFICATIONS_PAGE_SIZE } from './hooks/useRealtimeNotifications';
 import { useTranslation } from 'react-i18next';
 
 const API_URL = import.meta.env.VITE_API_URL;
@@ -20,6 +21,8 @@ function App() {
   const [tokensList, setTokensList] = useState([]);
   const [calendarsData, setCalendarsData] = useState(null);
   const [notificationsData, setNotificationsData] = useState(null);
+  const [notificationsCursor, setNotificationsCursor] = useState(null);
+  const [unreadNotificationsCount, setUnreadNotificationsCount] = useState(0);
   const [sharedCalendarsData, setSharedCalendarsData] = useState(null);
 
   const { userInfo } = useContext(UserContext);
@@ -337,6 +340,31 @@ function App() {
   }, []);
   
 
+  // Fonction pour charger la page suivante des notifications (plus anciennes)
+  const loadMoreNotifications = useCallback(async () => {
+    if (!notificationsCursor) return { success: true };
+    const params = new URLSearchParams({
+      limit: String(NOTIFICATIONS_PAGE_SIZE),
+      cursor: notificationsCursor,
+    });
+    const result = await performApiCall({
+      url: `${API_URL}/api/notifications?${params}`,
+      method: 'GET',
+      origin: 'NOTIFICATIONS_FETCH_MORE',
+      uid,
+      analyticsEvent: 'fetch_more_notifications',
+      analyticsData: { uid },
+    });
+    if (result.success) {
+      setNotificationsData((prev) => [
+        ...(prev || []),
+        ...result.notifications,
+      ]);
+      setNotificationsCursor(result.next_cursor);
+    }
+    return result;
+  }, [notificationsCursor]);
+
   // Fonction pour marquer une notification comme lue
   const readNotification = useCallback(async (notificationId) => {
     return await performApiCall({
@@ -563,6 +591,9 @@ function App() {
       readNotification,
       notificationsData,
       setNotificationsData,
+      hasMoreNotifications: notificationsCursor !== null,
+      loadMoreNotifications,
+      unreadNotificationsCount,
     },
 
     loadingStates: {
@@ -579,6 +610,8 @@ function App() {
 
     // NOTIFICATIONS
     setNotificationsData(null);
+    setNotificationsCursor(null);
+    setUnreadNotificationsCount(0);
 
     // SHARED CALENDARS
     setSharedCalendarsData(null);
@@ -661,6 +694,8 @@ function App() {
               setCalendarsData={setCalendarsData}
               setSharedCalendarsData={setSharedCalendarsData}
               setNotificationsData={setNotificationsData}
+              setNotificationsCursor={setNotificationsCursor}
+              setUnreadNotificationsCount={setUnreadNotificationsCount}
               setTokensList={setTokensList}
               setLoadingStates={setLoadingStates}
             />
@@ -99,7 +99,8 @@ function Navbar({ sharedProps }) {
     return () => document.removeEventListener('mousedown', handleClickOutside);
   }, []);
 
-  const { notificationsData, readNotification } = sharedProps.notifications;
+  const { notificationsData, readNotification, unreadNotificationsCount } =
+    sharedProps.notifications;
   const { acceptInvitation, rejectInvitation } =  sharedProps.sharedUserCalendars;
 
   if (isPillboxPage) {
@@ -270,16 +271,11 @@ function Navbar({ sharedProps }) {
                   onClick={() => setShowNotifDropdown(!showNotifDropdown)}
                 >
                   <i className="bi bi-bell fs-5"></i>
-                  {notificationsData &&
-                    notificationsData.filter((notif) => !notif.read).length >
-                      0 && (
-                      <span className="position-absolute top-10 start-90 translate-middle badge rounded-pill bg-danger fs-7">
-                        {
-                          notificationsData.filter((notif) => !notif.read)
-                            .length
-                        }
-                      </span>
-                    )}
+                  {unreadNotificationsCount > 0 && (
+                    <span className="position-absolute top-10 start-90 translate-middle badge rounded-pill bg-danger fs-7">
+                      {unreadNotificationsCount}
+                    </span>
+                  )}
                 </button>
                 {showNotifDropdown && (
                   <ul
@@ -458,12 +454,11 @@ function Navbar({ sharedProps }) {
           >
             <i className="bi bi-bell fs-4"></i>
             <div className="small">{t('notifications')}</div>
-            {notificationsData !== null &&
-              notificationsData.filter((notif) => !notif.read).length > 0 && (
-                <span className="position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger fs-7">
-                  {notificationsData.filter((notif) => !notif.read).length}
-                </span>
-              )}
+            {unreadNotificationsCount > 0 && (
+              <span className="position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger fs-7">
+                {unreadNotificationsCount}
+              </span>
+            )}
           </Link>
           <Link
             to="/settings"
@@ -11,6 +11,8 @@ export default function RealtimeManager({
   setCalendarsData,
   setSharedCalendarsData,
   setNotificationsData,
+  setNotificationsCursor,
+  setUnreadNotificationsCount,
   setTokensList,
   setLoadingStates,
 }) {
@@ -43,6 +45,8 @@ export default function RealtimeManager({
   );
   useRealtimeNotifications(
     isRealtimeEnabled ? setNotificationsData : null,
+    setNotificationsCursor,
+    setUnreadNotificationsCount,
     setLoadingStates
   );
   useRealtimeTokens(isRealtimeEnabled ? setTokensList : null, setLoadingStates);
@@ -54,6 +58,8 @@ RealtimeManager.propTypes = {
   setCalendarsData: PropTypes.func.isRequired,
   setSharedCalendarsData: PropTypes.func.isRequired,
   setNotificationsData: PropTypes.func.isRequired,
+  setNotificationsCursor: PropTypes.func.isRequired,
+  setUnreadNotificationsCount: PropTypes.func.isRequired,
   setTokensList: PropTypes.func.isRequired,
   setLoadingStates: PropTypes.func.isRequired,
 };
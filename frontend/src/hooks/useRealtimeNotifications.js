@@ -6,10 +6,44 @@ import { log } from '../utils/logger';
 import { logEvent } from 'firebase/analytics';
 
 const API_URL = import.meta.env.VITE_API_URL;
+export const NOTIFICATIONS_PAGE_SIZE = 50;
 
+// Une page du fil de notifications (la première si `cursor` est vide)
+export const fetchNotificationsPage = async (accessToken, cursor = null) => {
+  const params = new URLSearchParams({
+    limit: String(NOTIFICATIONS_PAGE_SIZE),
+  });
+  if (cursor) params.set('cursor', cursor);
+
+  const res = await fetch(`${API_URL}/api/notifications?${params}`, {
+    headers: {
+      Authorization: `Bearer ${accessToken}`,
+    },
+  });
+
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.error);
+  return data;
+};
+
+const fetchUnreadCount = async (accessToken) => {
+  const res = await fetch(`${API_URL}/api/notifications/unread-count`, {
+    headers: {
+      Authorization: `Bearer ${accessToken}`,
+    },
+  });
+
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.error);
+  return data.unread_count;
+};
+
+// Première page + compteur de non lues ; les pages suivantes sont chargées à la demande
 const fetchNotifications = async (
   uid,
   setNotificationsData,
+  setNotificationsCursor,
+  setUnreadNotificationsCount,
   setLoadingStates
 ) => {
   try {
@@ -18,19 +52,14 @@ const fetchNotifications = async (
     } = await supabase.auth.getSession();
     if (!session) throw new Error('Session Supabase non trouvée');
 
-    const res = await fetch(`${API_URL}/api/notifications`, {
-      headers: {
-        Authorization: `Bearer ${session.access_token}`,
-      },
-    });
-
-    const data = await res.json();
-    if (!res.ok) throw new Error(data.error);
+    const [data, unreadCount] = await Promise.all([
+      fetchNotificationsPage(session.access_token),
+      fetchUnreadCount(session.access_token),
+    ]);
 
-    const sortedNotifications = data.notifications.sort(
-      (a, b) => new Date(b.timestamp) - new Date(a.timestamp)
-    );
-    setNotificationsData(sortedNotifications);
+    setNotificationsData(data.notifications);
+    setNotificationsCursor(data.next_cursor);
+    setUnreadNotificationsCount(unreadCount);
     setLoadingStates((prev) => ({ ...prev, notifications: false }));
 
     analyticsPromise.then((analytics) => {
@@ -49,6 +78,8 @@ const fetchNotifications = async (
     });
   } catch (err) {
     setNotificationsData([]);
+    setNotificationsCursor(null);
+    setUnreadNotificationsCount(0);
     setLoadingStates((prev) => ({ ...prev, notifications: false }));
     log.error(err.message || 'Échec de récupération des notifications', err, {
       origin: 'NOTIFICATIONS_FETCH_ERROR',
@@ -59,6 +90,8 @@ const fetchNotifications = async (
 
 export const useRealtimeNotifications = (
   setNotificationsData,
+  setNotificationsCursor,
+  setUnreadNotificationsCount,
   setLoadingStates
 ) => {
   const { userInfo } = useContext(UserContext);
@@ -69,7 +102,15 @@ export const useRealtimeNotifications = (
 
     const uid = userInfo.uid;
     setLoadingStates((prev) => ({ ...prev, notifications: true }));
-    fetchNotifications(uid, setNotificationsData, setLoadingStates);
+    const refresh = () =>
+      fetchNotifications(
+        uid,
+        setNotificationsData,
+        setNotificationsCursor,
+        setUnreadNotificationsCount,
+        setLoadingStates
+      );
+    refresh();
 
     const channel = supabase
       .channel(`notifications-${uid}`)
@@ -82,7 +123,7 @@ export const useRealtimeNotifications = (
           filter: `user_id=eq.${uid}`,
         },
         () => {
-          fetchNotifications(uid, setNotificationsData, setLoadingStates);
+          refresh();
         }
       )
       .subscribe();
@@ -99,5 +140,11 @@ export const useRealtimeNotifications = (
         });
       }
     };
-  }, [userInfo, setNotificationsData, setLoadingStates]);
+  }, [
+    userInfo,
+    setNotificationsData,
+    setNotificationsCursor,
+    setUnreadNotificationsCount,
+    setLoadingStates,
+  ]);
 };
@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import NotificationLine from '../components/NotificationLine';
@@ -7,6 +7,13 @@ import ActionSheet from '../components/ActionSheet';
 function NotificationsPage({ notifications, sharedUserCalendars }) {
   const { t } = useTranslation();
   const navigate = useNavigate();
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    await notifications.loadMoreNotifications();
+    setLoadingMore(false);
+  };
 
   if (notifications.notificationsData === null) {
     return (
@@ -61,6 +68,21 @@ function NotificationsPage({ notifications, sharedUserCalendars }) {
           ))}
         </ul>
       )}
+
+      {notifications.hasMoreNotifications && (
+        <div className="text-center mt-3">
+          <button
+            className="btn btn-outline-primary"
+            onClick={handleLoadMore}
+            disabled={loadingMore}
+          >
+            {loadingMore && (
+              <span className="spinner-border spinner-border-sm me-2"></span>
+            )}
+            {t('load_more_notifications')}
+          </button>
+        </div>
+      )}
     </div>
   );
 }